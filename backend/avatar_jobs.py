@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+# Error recorded for jobs cut short by a shutdown or restart; clients can submit them again
+CANCELLED_ERROR = "cancelled: the server stopped before the job finished"
+
+# A pipeline takes (address, sex, report_stage) and returns {"image_url", "character_traits"}
+AvatarPipeline = Callable[[str, str, Callable[[str], None]], Awaitable[Dict]]
+
+
+class JobQueueFullError(Exception):
+    """Raised when the avatar job queue cannot accept more work."""
+
+
+class InMemoryJobStore:
+    """Job records kept in this process only."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: Dict) -> None:
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+class SQLiteJobStore:
+    """
+    Job records in a local SQLite file, so every gunicorn worker can answer status polls
+    for jobs submitted to any other worker.
+    """
+
+    COLUMNS = ["job_id", "status", "stage", "address", "sex", "image_url", "character_traits",
+               "error", "created_at", "updated_at"]
+
+    def __init__(self, path: str = "avatar_jobs.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS avatar_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    address TEXT NOT NULL,
+                    sex TEXT NOT NULL,
+                    image_url TEXT,
+                    character_traits TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def create(self, job: Dict) -> None:
+        row = {column: job.get(column) for column in self.COLUMNS}
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"INSERT INTO avatar_jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                [row[column] for column in self.COLUMNS]
+            )
+
+    def update(self, job_id: str, **fields) -> None:
+        if "character_traits" in fields and fields["character_traits"] is not None:
+            fields["character_traits"] = json.dumps(fields["character_traits"])
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"UPDATE avatar_jobs SET {assignments} WHERE job_id = ?",
+                [*fields.values(), job_id]
+            )
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        if job["character_traits"]:
+            job["character_traits"] = json.loads(job["character_traits"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM avatar_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+
+def create_job_store():
+    """Pick the job store from AVATAR_JOB_STORE ("sqlite" or "memory")."""
+    if os.environ.get("AVATAR_JOB_STORE", "sqlite") == "memory":
+        return InMemoryJobStore()
+    return SQLiteJobStore(os.environ.get("AVATAR_JOB_DB", "avatar_jobs.db"))
+
+
+class AvatarJobQueue:
+    """
+    Bounded queue of avatar generation jobs processed by a fixed pool of background workers.
+    Submitting returns a job id at once; progress and results are recorded in the job store.
+    """
+
+    def __init__(self, pipeline: AvatarPipeline, store=None, workers: int = 2, max_queue: int = 100):
+        self.pipeline = pipeline
+        self.store = store or InMemoryJobStore()
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} avatar job workers")
+
+    async def stop(self) -> None:
+        """Cancel the workers and fail every unfinished job, so status polls reach a terminal state."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while self._queue is not None and not self._queue.empty():
+            job_id = self._queue.get_nowait()
+            self.store.update(job_id, status=FAILED, error=CANCELLED_ERROR)
+            self._queue.task_done()
+
+    def submit(self, address: str, sex: str) -> Dict:
+        if self._queue is None:
+            raise RuntimeError("Avatar job queue has not been started")
+        if self._queue.full():
+            raise JobQueueFullError(f"Avatar job queue is full ({self.max_queue} jobs waiting)")
+
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "stage": None,
+            "address": address,
+            "sex": sex,
+            "image_url": None,
+            "character_traits": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.store.create(job)
+        self._queue.put_nowait(job["job_id"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.store.get(job_id)
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None:
+            return
+
+        def report_stage(stage: str) -> None:
+            logger.info(f"Avatar job {job_id}: {stage}")
+            self.store.update(job_id, stage=stage)
+
+        self.store.update(job_id, status=RUNNING)
+        try:
+            result = await self.pipeline(job["address"], job["sex"], report_stage)
+            self.store.update(
+                job_id,
+                status=SUCCEEDED,
+                stage="done",
+                image_url=result["image_url"],
+                character_traits=result["character_traits"]
+            )
+        except asyncio.CancelledError:
+            logger.warning(f"Avatar job {job_id} was cancelled")
+            self.store.update(job_id, status=FAILED, error=CANCELLED_ERROR)
+            raise
+        except Exception as e:
+            logger.error(f"Avatar job {job_id} failed: {e}", exc_info=True)
+            self.store.update(job_id, status=FAILED, error=str(e))
@@ -0,0 +1,122 @@
+import math
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from embeddings import tokenize
+
+# Question phrasing that carries no topic, dropped from queries so it does not dilute the confidence
+QUERY_STOPWORDS = frozenset("about define describe explain know mean meaning please tell".split())
+
+
+class BM25Index:
+    """
+    In-process BM25 inverted index over knowledge titles and contents.
+    Title terms count `title_weight` times so a document named after the query term ranks first.
+    Each posting list stores its documents' full BM25 contribution, so a query only sums arrays.
+    The posting lists are packed into flat arrays (see arrays()), which a knowledge snapshot stores
+    and from_arrays() serves straight from its memory maps without re-tokenizing the documents.
+    """
+
+    def __init__(self, documents: Sequence[Dict], k1: float = 1.5, b: float = 0.75, title_weight: int = 3):
+        count = len(documents)
+        term_counts = []
+        for i in range(count):
+            document = documents[i]
+            terms = tokenize(document["title"]) * title_weight + tokenize(document["content"])
+            term_counts.append(Counter(terms))
+        lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+        average_length = float(lengths.mean()) if count and lengths.mean() > 0 else 1.0
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for doc_index, counts in enumerate(term_counts):
+            for term, frequency in counts.items():
+                postings.setdefault(term, []).append((doc_index, frequency))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        idf = np.zeros(len(terms), dtype=np.float32)
+        doc_indices = []
+        contributions = []
+        for row, term in enumerate(terms):
+            entries = postings[term]
+            indices = np.array([doc_index for doc_index, _ in entries], dtype=np.int64)
+            frequencies = np.array([frequency for _, frequency in entries], dtype=np.float32)
+            idf[row] = math.log(1 + (count - len(entries) + 0.5) / (len(entries) + 0.5))
+            length_norm = k1 * (1 - b + b * lengths[indices] / average_length)
+            doc_indices.append(indices)
+            contributions.append(idf[row] * frequencies * (k1 + 1) / (frequencies + length_norm))
+            offsets[row + 1] = offsets[row] + len(entries)
+
+        self._set_arrays(
+            terms, offsets, idf,
+            np.concatenate(doc_indices) if doc_indices else np.zeros(0, dtype=np.int64),
+            np.concatenate(contributions).astype(np.float32) if contributions else np.zeros(0, dtype=np.float32),
+            count, k1,
+        )
+
+    @classmethod
+    def from_arrays(cls, terms: Sequence[str], offsets: np.ndarray, idf: np.ndarray, doc_indices: np.ndarray,
+                    contributions: np.ndarray, count: int, k1: float) -> "BM25Index":
+        """An index over posting arrays built earlier, e.g. memory-mapped from a knowledge snapshot."""
+        index = cls.__new__(cls)
+        index._set_arrays(terms, offsets, idf, doc_indices, contributions, count, k1)
+        return index
+
+    def _set_arrays(self, terms, offsets, idf, doc_indices, contributions, count, k1) -> None:
+        # Term i's postings are doc_indices[offsets[i]:offsets[i + 1]] with the matching contributions
+        self.terms = list(terms)
+        self.term_rows = {term: row for row, term in enumerate(self.terms)}
+        self.offsets = offsets
+        self.idf = idf
+        self.doc_indices = doc_indices
+        self.contributions = contributions
+        self.count = count
+        self.k1 = k1
+        self.max_idf = float(idf.max()) if len(idf) else 0.0
+
+    def arrays(self) -> Dict:
+        """The keyword arguments of from_arrays() that rebuild this index."""
+        return {
+            "terms": self.terms, "offsets": self.offsets, "idf": self.idf, "doc_indices": self.doc_indices,
+            "contributions": self.contributions, "count": self.count, "k1": self.k1,
+        }
+
+    def search(self, query: str, limit: int) -> Tuple[List[Tuple[int, float]], float]:
+        """
+        Return the best (document index, score) pairs and a confidence in [0, 1]: the top score as a
+        share of the best score the query terms could reach, so it drops when few query terms match.
+        """
+        terms = list(dict.fromkeys(term for term in tokenize(query) if term not in QUERY_STOPWORDS))
+        if not terms or not self.count:
+            return [], 0.0
+        scores = np.zeros(self.count, dtype=np.float32)
+        # An unknown term could at best match as well as the rarest known term
+        ceiling = 0.0
+        for term in terms:
+            row = self.term_rows.get(term)
+            if row is None:
+                ceiling += self.max_idf
+                continue
+            start, end = self.offsets[row], self.offsets[row + 1]
+            scores[self.doc_indices[start:end]] += self.contributions[start:end]
+            ceiling += float(self.idf[row])
+
+        matched = np.flatnonzero(scores > 0)
+        if not len(matched):
+            return [], 0.0
+        if len(matched) > limit:
+            matched = matched[np.argpartition(scores[matched], -limit)[-limit:]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+
+        confidence = min(float(scores[matched[0]]) / (ceiling * (self.k1 + 1)), 1.0)
+        return [(int(i), float(scores[i])) for i in matched], confidence
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[Dict]], limit: int, k: int = 60) -> List[Dict]:
+    """Merge ranked result lists by summing 1 / (k + rank) per document id."""
+    fused: Dict = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            entry = fused.setdefault(result["id"], {**result, "rrf_score": 0.0})
+            entry["rrf_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda result: result["rrf_score"], reverse=True)[:limit]
@@ -0,0 +1,129 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FRESH = "fresh"
+STALE = "stale"
+MISS = "miss"
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache with per-entry TTLs.
+    An expired entry stays servable as stale for `stale_ttl` more seconds so callers can
+    return it immediately and refresh it in the background (stale-while-revalidate).
+    """
+
+    def __init__(self, max_size: int = 1024, default_ttl: float = 300.0, stale_ttl: float = 0.0):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def lookup(self, key: Hashable) -> Tuple[str, Any]:
+        """Return (state, value) where state is FRESH, STALE or MISS."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS, None
+            value, expires_at, stale_until = entry
+            if now < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return FRESH, value
+            if now < stale_until:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                return STALE, value
+            del self._entries[key]
+            self.misses += 1
+            return MISS, None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        state, value = self.lookup(key)
+        return default if state == MISS else value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, stale_ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at, expires_at + stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses}
+
+
+def cached_async(cache: TTLCache, key_func: Callable[..., Hashable], ttl: Optional[float] = None,
+                 stale_ttl: Optional[float] = None):
+    """
+    Cache an async function's results in `cache` under key_func(*args, **kwargs).
+    None results are treated as failures and never cached. Concurrent misses for the same key
+    share one call, and stale entries are returned at once while a background task on the
+    caller's event loop refreshes them.
+    """
+    def decorator(func):
+        # In-flight calls per (event loop, key), so callers on one loop never await another loop's future
+        inflight: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+
+        async def load(key, args, kwargs):
+            value = await func(*args, **kwargs)
+            if value is not None:
+                cache.set(key, value, ttl, stale_ttl)
+            return value
+
+        def start_load(key, args, kwargs) -> asyncio.Future:
+            loop = asyncio.get_running_loop()
+            inflight_key = (id(loop), key)
+            future = inflight.get(inflight_key)
+            if future is None:
+                future = asyncio.ensure_future(load(key, args, kwargs))
+                inflight[inflight_key] = future
+                future.add_done_callback(lambda _: inflight.pop(inflight_key, None))
+            return future
+
+        def log_refresh_error(future: asyncio.Future) -> None:
+            if not future.cancelled() and future.exception() is not None:
+                logger.error(f"Error refreshing cached {func.__name__}: {future.exception()}")
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs)
+            state, value = cache.lookup(key)
+            if state == FRESH:
+                return value
+            if state == STALE:
+                start_load(key, args, kwargs).add_done_callback(log_refresh_error)
+                return value
+            # shield() keeps a shared load alive if one of its waiters is cancelled
+            return await asyncio.shield(start_load(key, args, kwargs))
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
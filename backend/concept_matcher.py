@@ -0,0 +1,104 @@
+import os
+import re
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CONCEPTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "concepts.json")
+
+# Spaces and hyphens inside a term are interchangeable ("smart-contract" == "smart contract")
+SEPARATOR_PATTERN = re.compile(r"[\s\-]+")
+# A trie node key that marks the end of a term
+TERM_END = ""
+
+
+def normalize_term(term: str) -> str:
+    return SEPARATOR_PATTERN.sub(" ", term.strip().lower())
+
+
+def _trie_pattern(node: Dict) -> str:
+    """Turn a character trie into a regex that prefers the longest term at every branch."""
+    branches = []
+    for char, child in sorted(node.items()):
+        if char == TERM_END:
+            continue
+        char_pattern = r"[\s\-]+" if char == " " else re.escape(char)
+        branches.append(char_pattern + _trie_pattern(child))
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if TERM_END in node:
+        # The term can stop here, but the greedy group tries longer terms first
+        return "(?:" + pattern + ")?"
+    return pattern
+
+
+class ConceptMatcher:
+    """
+    Finds concepts in a message with a single compiled regex built from a trie of every
+    concept name and alias. Matches are case-insensitive, must start and end on word
+    boundaries (so "gas" does not match "Vegas"), may carry a plural "s"/"es", and overlapping
+    terms resolve to the longest one ("blockchain" wins over "block"). Each match is
+    reported under its canonical concept name.
+    """
+
+    def __init__(self, concepts: Dict[str, List[str]]):
+        self.concepts = list(concepts)
+        self.aliases: Dict[str, str] = {}
+        for concept, aliases in concepts.items():
+            for term in [concept, *aliases]:
+                key = normalize_term(term)
+                if key and key not in self.aliases:
+                    self.aliases[key] = concept
+
+        trie: Dict = {}
+        for term in self.aliases:
+            node = trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[TERM_END] = {}
+        self.pattern = re.compile(r"(?<!\w)" + _trie_pattern(trie) + r"(?:e?s)?(?!\w)", re.IGNORECASE) if trie else None
+
+    @classmethod
+    def from_list(cls, concepts: Iterable[str]) -> "ConceptMatcher":
+        return cls({concept: [] for concept in concepts})
+
+    @classmethod
+    def from_file(cls, path: str) -> "ConceptMatcher":
+        """Load a JSON object mapping each canonical concept to a list of aliases."""
+        with open(path) as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def from_env(cls, fallback: Optional[Iterable[str]] = None) -> "ConceptMatcher":
+        path = os.environ.get("CONCEPTS_PATH") or CONCEPTS_PATH
+        try:
+            matcher = cls.from_file(path)
+            logger.info(f"Loaded {len(matcher.concepts)} concepts and {len(matcher.aliases)} terms from {path}")
+            return matcher
+        except Exception as e:
+            logger.error(f"Error loading concepts from {path}: {e}")
+            return cls.from_list(fallback or [])
+
+    def _canonical(self, matched: str) -> Optional[str]:
+        key = normalize_term(matched)
+        if key in self.aliases:
+            return self.aliases[key]
+        # Strip the optional plural suffix
+        for suffix in ("s", "es"):
+            if key.endswith(suffix) and key[:-len(suffix)] in self.aliases:
+                return self.aliases[key[:-len(suffix)]]
+        return None
+
+    def detect(self, message: str) -> List[str]:
+        """Canonical concepts mentioned in the message, in order of first mention."""
+        if self.pattern is None:
+            return []
+        detected = []
+        for match in self.pattern.finditer(message):
+            concept = self._canonical(match.group(0))
+            if concept is not None and concept not in detected:
+                detected.append(concept)
+        return detected
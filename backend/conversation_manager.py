@@ -1,8 +1,14 @@
 import os
 import json
+import asyncio
+from datetime import datetime, timezone
 from typing import List, Dict, Optional
-from supabase import create_client, Client
 from dotenv import load_dotenv
+from cache import TTLCache
+from write_behind import WriteBehindBuffer
+from concept_matcher import ConceptMatcher
+from llm_client import llm_client, output_to_text
+from conversation_store import ConversationStore, create_conversation_store
 
 # Load environment variables
 if os.path.isfile('.env'):
@@ -10,96 +16,239 @@ if os.path.isfile('.env'):
 elif os.path.isfile('../.env'):
     load_dotenv('../.env')
 
-# Initialize Supabase client
-supabase_url = os.environ.get("SUPABASE_URL")
-supabase_key = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
-
-# Define blockchain concepts for tracking
+# Core concepts, used when data/concepts.json (or CONCEPTS_PATH) cannot be loaded
 BLOCKCHAIN_CONCEPTS = [
     "blockchain", "wallet", "smart contract", "decentralisation", 
     "gas", "DAO", "NFT", "token", "mining", "consensus", 
     "private key", "public key", "transaction", "block"
 ]
 
+# Prompt used to fold a turn that leaves the recent window into the session summary
+SUMMARY_PROMPT = """You keep a running summary of a conversation between a user and Niloy, a wizard who teaches blockchain.
+Update the summary with the new exchange. Keep the topics the user asked about, what they learned,
+details about their wallet and any open questions. Write plain prose of at most {max_words} words.
+
+Current summary:
+{summary}
+
+New exchange:
+User: {user_message}
+Niloy: {npc_response}
+
+Updated summary:"""
+
 class ConversationManager:
-    def __init__(self, max_history_turns: int = 5):
+    def __init__(self, max_history_turns: int = 5, cache_size: int = None, cache_ttl: float = None,
+                 summarize: bool = None, recent_turns: int = None, store: ConversationStore = None):
         self.max_history_turns = max_history_turns
+        self.store = store or create_conversation_store()
+        # In summary mode the prompt gets a rolling summary plus only the `recent_turns` latest turns.
+        # Each turn that leaves that window is folded into the summary by a background task.
+        # Off by default: every fold is an extra generation on the shared LLM client.
+        if summarize is None:
+            summarize = os.environ.get("CONVERSATION_SUMMARY", "false").lower() == "true"
+        self.summarize = summarize
+        self.recent_turns = recent_turns or int(os.environ.get("SUMMARY_RECENT_TURNS", 2))
+        self.summary_max_words = int(os.environ.get("SUMMARY_MAX_WORDS", 150))
+        self._summary_locks: Dict[str, asyncio.Lock] = {}
+        self._pending_folds: Dict[str, int] = {}
+        self._summary_tasks = set()
+        # Folds are low priority: at most this many hold or wait for an LLM slot, leaving the rest to chat replies
+        self._summary_slots = asyncio.Semaphore(int(os.environ.get("SUMMARY_MAX_CONCURRENCY", 1)))
+        # Per-session cache of recent turns and learned concepts. Supabase is only read on a miss,
+        # and writes update cached sessions in place (write-through). The cache is per process and
+        # another worker's writes never invalidate it, so its short TTL bounds how stale a session
+        # served by several gunicorn workers can be: SESSION_CACHE_TTL plus WRITE_BEHIND_INTERVAL.
+        cache_size = cache_size or int(os.environ.get("SESSION_CACHE_SIZE", 1000))
+        cache_ttl = cache_ttl or float(os.environ.get("SESSION_CACHE_TTL", 30))
+        self.history_cache = TTLCache(max_size=cache_size, default_ttl=cache_ttl)
+        self.concepts_cache = TTLCache(max_size=cache_size, default_ttl=cache_ttl)
+        self.summary_cache = TTLCache(max_size=cache_size, default_ttl=cache_ttl)
+        # Turns and learned concepts are written in bulk off the request path
+        self.write_buffer = WriteBehindBuffer(
+            flush_interval=float(os.environ.get("WRITE_BEHIND_INTERVAL", 2)),
+            max_batch=int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", 100)),
+            max_attempts=int(os.environ.get("WRITE_BEHIND_MAX_ATTEMPTS", 5))
+        )
+        self.write_buffer.register('conversation_history', self.store.insert_turns)
+        self.write_buffer.register('learned_concepts', self._upsert_concepts)
+        self.write_buffer.register('conversation_summaries', self._upsert_summaries)
+        self.concept_matcher = ConceptMatcher.from_env(fallback=BLOCKCHAIN_CONCEPTS)
+
+    async def _upsert_concepts(self, rows: List[Dict]) -> None:
+        # A concept can reach the buffer twice if its session fell out of the cache in between
+        unique_rows = list({(row['session_id'], row['concept']): row for row in rows}.values())
+        await self.store.upsert_concepts(unique_rows)
+
+    async def _upsert_summaries(self, rows: List[Dict]) -> None:
+        # Only the latest summary per session matters
+        latest_rows = list({row['session_id']: row for row in rows}.values())
+        await self.store.upsert_summaries(latest_rows)
+
+    async def close(self) -> None:
+        """Finish pending summary updates, then write out everything still buffered."""
+        await asyncio.gather(*self._summary_tasks, return_exceptions=True)
+        await self.write_buffer.stop()
+        await self.store.close()
 
     async def get_conversation_history(self, session_id: str) -> List[Dict]:
         """Retrieve conversation history for a given session."""
+        cached_history = self.history_cache.get(session_id)
+        if cached_history is not None:
+            return list(cached_history)
+
         try:
-            response = supabase.table('conversation_history') \
-                .select('*') \
-                .eq('session_id', session_id) \
-                .order('timestamp', desc=True) \
-                .limit(self.max_history_turns) \
-                .execute()
-            
-            # Reverse to get chronological order
-            return list(reversed(response.data))
+            # Stored turns in chronological order, then turns that are still buffered
+            history = await self.store.get_recent_turns(session_id, self.max_history_turns)
+            stored = {(turn['user_message'], turn['npc_response']) for turn in history}
+            for turn in self.write_buffer.rows_for('conversation_history', 'session_id', session_id):
+                if (turn['user_message'], turn['npc_response']) not in stored:
+                    history.append(turn)
+            history = history[-self.max_history_turns:]
+            self.history_cache.set(session_id, history)
+            return list(history)
         except Exception as e:
             print(f"Error retrieving conversation history: {e}")
             return []
 
     async def save_conversation_turn(self, session_id: str, user_message: str, npc_response: str) -> None:
-        """Save a conversation turn to the database."""
+        """Buffer a conversation turn for the next bulk write."""
+        turn = {
+            'session_id': session_id,
+            'user_message': user_message,
+            'npc_response': npc_response,
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        }
+        self.write_buffer.add('conversation_history', turn)
+
+        cached_history = self.history_cache.get(session_id)
+        if cached_history is not None:
+            history = (cached_history + [turn])[-self.max_history_turns:]
+            self.history_cache.set(session_id, history)
+        elif self.summarize:
+            # Includes the turn just buffered
+            history = await self.get_conversation_history(session_id)
+
+        if self.summarize and len(history) > self.recent_turns:
+            self._schedule_summary_update(session_id, history[-(self.recent_turns + 1)])
+
+    async def get_conversation_summary(self, session_id: str) -> str:
+        """Retrieve the rolling summary of turns older than the recent window."""
+        cached_summary = self.summary_cache.get(session_id)
+        if cached_summary is not None:
+            return cached_summary
+
+        buffered = self.write_buffer.rows_for('conversation_summaries', 'session_id', session_id)
+        if buffered:
+            return buffered[-1]['summary']
+
         try:
-            supabase.table('conversation_history').insert({
-                'session_id': session_id,
-                'user_message': user_message,
-                'npc_response': npc_response,
-                'timestamp': 'now()'
-            }).execute()
+            summary = await self.store.get_summary(session_id) or ""
+            self.summary_cache.set(session_id, summary)
+            return summary
+        except Exception as e:
+            print(f"Error retrieving conversation summary: {e}")
+            return ""
+
+    async def get_prompt_history(self, session_id: str) -> Dict:
+        """The summary and raw turns to show in the prompt."""
+        if not self.summarize:
+            return {'summary': "", 'turns': await self.get_conversation_history(session_id)}
+
+        history, summary = await asyncio.gather(
+            self.get_conversation_history(session_id),
+            self.get_conversation_summary(session_id)
+        )
+        # Turns still being folded in are not in the summary yet, so keep them verbatim
+        keep = self.recent_turns + self._pending_folds.get(session_id, 0)
+        return {'summary': summary, 'turns': history[-keep:]}
+
+    def _schedule_summary_update(self, session_id: str, turn: Dict) -> None:
+        self._pending_folds[session_id] = self._pending_folds.get(session_id, 0) + 1
+        task = asyncio.create_task(self._fold_into_summary(session_id, turn))
+        self._summary_tasks.add(task)
+        task.add_done_callback(self._summary_tasks.discard)
+
+    async def _fold_into_summary(self, session_id: str, turn: Dict) -> None:
+        """Merge one turn into the session summary. Folds for a session run one at a time, in order."""
+        lock = self._summary_locks.setdefault(session_id, asyncio.Lock())
+        try:
+            async with lock:
+                summary = await self.get_conversation_summary(session_id)
+                async with self._summary_slots:
+                    output = await llm_client.run({
+                        "top_p": 0.9,
+                        "temperature": 0.3,
+                        "max_new_tokens": self.summary_max_words * 2,
+                        "query": SUMMARY_PROMPT.format(
+                            max_words=self.summary_max_words,
+                            summary=summary or "(empty)",
+                            user_message=turn['user_message'],
+                            npc_response=turn['npc_response']
+                        ),
+                        "tools": "[]",
+                    })
+                new_summary = output_to_text(output).strip()
+                if new_summary:
+                    self.write_buffer.add('conversation_summaries', {
+                        'session_id': session_id,
+                        'summary': new_summary,
+                        'timestamp': datetime.now(timezone.utc).isoformat()
+                    })
+                    self.summary_cache.set(session_id, new_summary)
         except Exception as e:
-            print(f"Error saving conversation turn: {e}")
+            print(f"Error updating conversation summary: {e}")
+        finally:
+            self._pending_folds[session_id] -= 1
+            if not self._pending_folds[session_id]:
+                del self._pending_folds[session_id]
+                if not lock.locked():
+                    self._summary_locks.pop(session_id, None)
 
     async def get_learned_concepts(self, session_id: str) -> List[str]:
         """Retrieve concepts that the user has learned about."""
+        cached_concepts = self.concepts_cache.get(session_id)
+        if cached_concepts is not None:
+            return list(cached_concepts)
+
         try:
-            response = supabase.table('learned_concepts') \
-                .select('concept') \
-                .eq('session_id', session_id) \
-                .execute()
-            
-            return [item['concept'] for item in response.data]
+            concepts = await self.store.get_learned_concepts(session_id)
+            for row in self.write_buffer.rows_for('learned_concepts', 'session_id', session_id):
+                if row['concept'] not in concepts:
+                    concepts.append(row['concept'])
+            self.concepts_cache.set(session_id, concepts)
+            return list(concepts)
         except Exception as e:
             print(f"Error retrieving learned concepts: {e}")
             return []
 
     async def mark_concept_learned(self, session_id: str, concept: str) -> None:
         """Mark a concept as learned by the user."""
-        try:
-            supabase.table('learned_concepts').insert({
+        await self.mark_concepts_learned(session_id, [concept])
+
+    async def mark_concepts_learned(self, session_id: str, concepts: List[str]) -> None:
+        """Buffer the concepts this session has not learned yet for the next bulk upsert."""
+        known_concepts = await self.get_learned_concepts(session_id)
+        new_concepts = [concept for concept in dict.fromkeys(concepts) if concept not in known_concepts]
+        if not new_concepts:
+            return
+
+        timestamp = datetime.now(timezone.utc).isoformat()
+        for concept in new_concepts:
+            self.write_buffer.add('learned_concepts', {
                 'session_id': session_id,
                 'concept': concept,
-                'timestamp': 'now()'
-            }).execute()
-        except Exception as e:
-            print(f"Error marking concept as learned: {e}")
+                'timestamp': timestamp
+            })
+        self.concepts_cache.set(session_id, known_concepts + new_concepts)
 
     def detect_concepts_in_message(self, message: str) -> List[str]:
         """Detect blockchain concepts mentioned in a message."""
-        message_lower = message.lower()
-        detected_concepts = []
-        
-        for concept in BLOCKCHAIN_CONCEPTS:
-            if concept.lower() in message_lower:
-                detected_concepts.append(concept)
-        
-        return detected_concepts
-
-    def format_conversation_history(self, history: List[Dict]) -> str:
-        """Format conversation history for the prompt."""
-        formatted_history = ""
+        return self.concept_matcher.detect(message)
+
+    def format_history_entries(self, history: List[Dict], summary: str = "") -> List[str]:
+        """The summary of earlier turns followed by one entry per turn, oldest first."""
+        entries = [f"Summary of the earlier conversation: {summary}"] if summary else []
         for turn in history:
-            formatted_history += f"User: {turn['user_message']}\n"
-            formatted_history += f"Niloy: {turn['npc_response']}\n\n"
-        return formatted_history
-
-    def format_learned_concepts(self, concepts: List[str]) -> str:
-        """Format learned concepts for the prompt."""
-        if not concepts:
-            return "You haven't explored any concepts yet."
-        
-        return "You have learned about: " + ", ".join(concepts) + "." 
\ No newline at end of file
+            entries.append(f"User: {turn['user_message']}\nNiloy: {turn['npc_response']}")
+        return entries
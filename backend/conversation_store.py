@@ -0,0 +1,207 @@
+import os
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from db import db
+
+
+class ConversationStore(ABC):
+    """Persistence for conversation turns, learned concepts and rolling summaries."""
+
+    @abstractmethod
+    async def get_recent_turns(self, session_id: str, limit: int) -> List[Dict]:
+        """The latest `limit` turns of a session, oldest first."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_learned_concepts(self, session_id: str) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_summary(self, session_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def insert_turns(self, rows: List[Dict]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def upsert_concepts(self, rows: List[Dict]) -> None:
+        """Insert concept rows, skipping any (session_id, concept) pair that already exists."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def upsert_summaries(self, rows: List[Dict]) -> None:
+        """Insert or replace the summary of each session."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release the store's resources; stores without any keep this no-op."""
+
+
+class SupabaseConversationStore(ConversationStore):
+    """Tables from the Supabase migrations, accessed through the shared async client."""
+
+    async def get_recent_turns(self, session_id: str, limit: int) -> List[Dict]:
+        response = await db.execute(lambda client: client.table('conversation_history')
+            .select('*')
+            .eq('session_id', session_id)
+            .order('timestamp', desc=True)
+            .limit(limit))
+        # Reverse to get chronological order
+        return list(reversed(response.data))
+
+    async def get_learned_concepts(self, session_id: str) -> List[str]:
+        response = await db.execute(lambda client: client.table('learned_concepts')
+            .select('concept')
+            .eq('session_id', session_id))
+        return [item['concept'] for item in response.data]
+
+    async def get_summary(self, session_id: str) -> Optional[str]:
+        response = await db.execute(lambda client: client.table('conversation_summaries')
+            .select('summary')
+            .eq('session_id', session_id)
+            .limit(1))
+        return response.data[0]['summary'] if response.data else None
+
+    async def insert_turns(self, rows: List[Dict]) -> None:
+        await db.execute(lambda client: client.table('conversation_history').insert(rows), idempotent=False)
+
+    async def upsert_concepts(self, rows: List[Dict]) -> None:
+        await db.execute(lambda client: client.table('learned_concepts').upsert(
+            rows, on_conflict='session_id,concept', ignore_duplicates=True
+        ))
+
+    async def upsert_summaries(self, rows: List[Dict]) -> None:
+        await db.execute(lambda client: client.table('conversation_summaries').upsert(
+            rows, on_conflict='session_id'
+        ))
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    The same tables and indexes in a local SQLite file, for single-node deployments and offline runs.
+    WAL mode lets reads proceed while a write is in progress. Each thread keeps its own connection,
+    and the constant parameterized statements below stay in that connection's prepared statement cache.
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS conversation_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            user_message TEXT NOT NULL,
+            npc_response TEXT NOT NULL,
+            timestamp TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS learned_concepts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            concept TEXT NOT NULL,
+            timestamp TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+            UNIQUE(session_id, concept)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            session_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            timestamp TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_conversation_history_session_id ON conversation_history(session_id)",
+        "CREATE INDEX IF NOT EXISTS idx_conversation_history_timestamp ON conversation_history(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_learned_concepts_session_id ON learned_concepts(session_id)",
+        "CREATE INDEX IF NOT EXISTS idx_learned_concepts_concept ON learned_concepts(concept)",
+    ]
+
+    SELECT_RECENT_TURNS = (
+        "SELECT * FROM conversation_history WHERE session_id = ? "
+        "ORDER BY timestamp DESC, id DESC LIMIT ?"
+    )
+    SELECT_CONCEPTS = "SELECT concept FROM learned_concepts WHERE session_id = ?"
+    SELECT_SUMMARY = "SELECT summary FROM conversation_summaries WHERE session_id = ?"
+    INSERT_TURN = (
+        "INSERT INTO conversation_history (session_id, user_message, npc_response, timestamp) "
+        "VALUES (:session_id, :user_message, :npc_response, :timestamp)"
+    )
+    INSERT_CONCEPT = (
+        "INSERT OR IGNORE INTO learned_concepts (session_id, concept, timestamp) "
+        "VALUES (:session_id, :concept, :timestamp)"
+    )
+    UPSERT_SUMMARY = (
+        "INSERT INTO conversation_summaries (session_id, summary, timestamp) "
+        "VALUES (:session_id, :summary, :timestamp) "
+        "ON CONFLICT(session_id) DO UPDATE SET summary = excluded.summary, timestamp = excluded.timestamp"
+    )
+
+    def __init__(self, path: str = "conversations.db"):
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            connection.row_factory = sqlite3.Row
+            # Safe with WAL: a power loss can only drop the latest commits, never corrupt the file
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def _fetch(self, sql: str, params) -> List[sqlite3.Row]:
+        return self._connection().execute(sql, params).fetchall()
+
+    def _write(self, sql: str, rows: List[Dict]) -> None:
+        with self._connection() as connection:
+            connection.executemany(sql, rows)
+
+    async def get_recent_turns(self, session_id: str, limit: int) -> List[Dict]:
+        rows = await asyncio.to_thread(self._fetch, self.SELECT_RECENT_TURNS, (session_id, limit))
+        return [dict(row) for row in reversed(rows)]
+
+    async def get_learned_concepts(self, session_id: str) -> List[str]:
+        rows = await asyncio.to_thread(self._fetch, self.SELECT_CONCEPTS, (session_id,))
+        return [row['concept'] for row in rows]
+
+    async def get_summary(self, session_id: str) -> Optional[str]:
+        rows = await asyncio.to_thread(self._fetch, self.SELECT_SUMMARY, (session_id,))
+        return rows[0]['summary'] if rows else None
+
+    async def insert_turns(self, rows: List[Dict]) -> None:
+        await asyncio.to_thread(self._write, self.INSERT_TURN, rows)
+
+    async def upsert_concepts(self, rows: List[Dict]) -> None:
+        await asyncio.to_thread(self._write, self.INSERT_CONCEPT, rows)
+
+    async def upsert_summaries(self, rows: List[Dict]) -> None:
+        await asyncio.to_thread(self._write, self.UPSERT_SUMMARY, rows)
+
+    async def close(self) -> None:
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def create_conversation_store() -> ConversationStore:
+    """Pick the conversation store from CONVERSATION_STORE ("supabase" or "sqlite")."""
+    if os.environ.get("CONVERSATION_STORE", "supabase") == "sqlite":
+        return SQLiteConversationStore(os.environ.get("CONVERSATION_DB", "conversations.db"))
+    return SupabaseConversationStore()
@@ -0,0 +1,104 @@
+import os
+import asyncio
+import logging
+import httpx
+from dotenv import load_dotenv
+from typing import Any, Awaitable, Callable, Dict
+from supabase import AsyncClient, AsyncClientOptions, acreate_client
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+if os.path.isfile('.env'):
+    load_dotenv()
+elif os.path.isfile('../.env'):
+    load_dotenv('../.env')
+
+# Failures where the request never reached Supabase, so even inserts are safe to resend
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Failures that may have happened after Supabase applied the request, retried for idempotent calls only
+TRANSIENT_ERRORS = (httpx.TransportError, asyncio.TimeoutError)
+
+
+class Database:
+    """
+    Shared async access to Supabase for every backend module.
+    Each event loop gets one AsyncClient whose keep-alive connection pool is reused by all queries.
+    At most `max_concurrency` calls are in flight per loop, each call has a timeout, and
+    transient failures are retried with exponential backoff.
+    """
+
+    def __init__(self, url: str, key: str, timeout: float = 10.0, retries: int = 2,
+                 backoff: float = 0.2, max_concurrency: int = 20):
+        self.url = url
+        self.key = key
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self._clients: Dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+        self._limits: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+
+    @classmethod
+    def from_env(cls) -> "Database":
+        return cls(
+            os.environ.get("SUPABASE_URL"),
+            os.environ.get("SUPABASE_KEY"),
+            timeout=float(os.environ.get("SUPABASE_TIMEOUT", 10)),
+            retries=int(os.environ.get("SUPABASE_RETRIES", 2)),
+            max_concurrency=int(os.environ.get("SUPABASE_MAX_CONCURRENCY", 20)),
+        )
+
+    async def client(self) -> AsyncClient:
+        loop = asyncio.get_running_loop()
+        task = self._clients.get(loop)
+        if task is None:
+            # Concurrent first callers share one creation task
+            options = AsyncClientOptions(postgrest_client_timeout=self.timeout, storage_client_timeout=self.timeout)
+            task = asyncio.ensure_future(acreate_client(self.url, self.key, options=options))
+            self._clients[loop] = task
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            self._clients.pop(loop, None)
+            raise
+
+    def _limit(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        limit = self._limits.get(loop)
+        if limit is None:
+            limit = asyncio.Semaphore(self.max_concurrency)
+            self._limits[loop] = limit
+        return limit
+
+    async def call(self, func: Callable[[AsyncClient], Awaitable[Any]], idempotent: bool = True) -> Any:
+        """
+        Await func(client) with the concurrency cap, timeout and retries applied.
+        func is called again on every attempt, so it must build its request from scratch.
+        """
+        client = await self.client()
+        retry_on = TRANSIENT_ERRORS if idempotent else CONNECT_ERRORS
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._limit():
+                    return await asyncio.wait_for(func(client), timeout=self.timeout)
+            except retry_on as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f"Supabase call failed ({e!r}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def execute(self, build: Callable[[AsyncClient], Any], idempotent: bool = True) -> Any:
+        """Run a PostgREST query built by build(client), e.g. lambda client: client.table('x').select('*')."""
+        return await self.call(lambda client: build(client).execute(), idempotent=idempotent)
+
+    async def aclose(self) -> None:
+        """Close the client bound to the running event loop."""
+        task = self._clients.pop(asyncio.get_running_loop(), None)
+        if task is not None and task.done() and not task.exception():
+            await task.result().postgrest.aclose()
+
+
+# Shared database used by the conversation, RAG and storage modules
+db = Database.from_env()
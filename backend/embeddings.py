@@ -0,0 +1,172 @@
+import os
+import re
+import math
+import zlib
+import asyncio
+import logging
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+import numpy as np
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Matches the vector(1536) column in the blockchain_knowledge migration
+EMBEDDING_DIM = 1536
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how i in is it its me my of on or so that the this "
+    "to was what when where which who why will with you your".split()
+)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _stem(word: str) -> str:
+    # Fold simple plurals so "nfts" and "nft" share features
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords, shared by the hashing embedder and the BM25 index."""
+    return [_stem(word) for word in TOKEN_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+
+
+@lru_cache(maxsize=65536)
+def _feature_slot(feature: str, dim: int) -> Tuple[int, float]:
+    # crc32 is stable across processes, unlike hash(), so stored and query vectors agree
+    digest = zlib.crc32(feature.encode("utf-8"))
+    return digest % dim, 1.0 if digest & 0x80000000 else -1.0
+
+
+class HashingEmbedder:
+    """
+    Offline CPU embeddings: word unigrams, word bigrams and character trigrams are hashed into a
+    fixed-size signed vector with sublinear term frequency, then L2-normalized. Texts that share
+    vocabulary get a high cosine similarity, which is what knowledge-base lookup needs, at a cost
+    of microseconds per text and no network calls.
+    """
+
+    local = True
+    # Cosine similarities are lower than for learned embeddings, so related texts need a lower cut-off
+    match_threshold = 0.2
+
+    def __init__(self, dim: int = EMBEDDING_DIM, bigram_weight: float = 0.5, trigram_weight: float = 0.25):
+        self.dim = dim
+        self.bigram_weight = bigram_weight
+        self.trigram_weight = trigram_weight
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        words = tokenize(text)
+        features = [(f"w:{word}", 1.0) for word in words]
+        features += [(f"b:{first} {second}", self.bigram_weight) for first, second in zip(words, words[1:])]
+        for word in words:
+            padded = f"<{word}>"
+            features += [(f"c:{padded[i:i + 3]}", self.trigram_weight) for i in range(len(padded) - 2)]
+        return features
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts, weights = {}, {}
+            for feature, weight in self._features(text):
+                counts[feature] = counts.get(feature, 0) + 1
+                weights[feature] = weight
+            for feature, count in counts.items():
+                slot, sign = _feature_slot(feature, self.dim)
+                vectors[row, slot] += sign * weights[feature] * (1.0 + math.log(count))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class OpenAIEmbedder:
+    """OpenAI text-embedding-ada-002, one API request per batch."""
+
+    local = False
+    match_threshold = 0.7
+
+    def __init__(self, api_key: str, model: str = "text-embedding-ada-002"):
+        try:
+            import openai
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_PROVIDER=openai (or OPENAI_API_KEY without EMBEDDING_PROVIDER) needs the openai package: "
+                "pip install openai, or set EMBEDDING_PROVIDER=hashing"
+            ) from e
+        self.model = model
+        self._client = openai.OpenAI(api_key=api_key)
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        response = self._client.embeddings.create(model=self.model, input=list(texts))
+        return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+
+def create_embedder():
+    """Pick the provider from EMBEDDING_PROVIDER ("hashing" or "openai"; by default openai when OPENAI_API_KEY is set)."""
+    provider = os.environ.get("EMBEDDING_PROVIDER")
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if provider == "openai" or (provider is None and api_key):
+        return OpenAIEmbedder(api_key)
+    return HashingEmbedder()
+
+
+class EmbeddingEngine:
+    """
+    Embeds texts through a provider in batches of `batch_size`, with an LRU cache keyed by
+    normalized text so repeated queries and documents are embedded once.
+    Stored documents and queries must be embedded by the same provider.
+    """
+
+    def __init__(self, provider=None, cache_size: int = 4096, batch_size: int = 64):
+        self.provider = provider or HashingEmbedder()
+        self.batch_size = batch_size
+        self.cache = TTLCache(max_size=cache_size, default_ttl=math.inf)
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingEngine":
+        provider = create_embedder()
+        logger.info(f"Using {type(provider).__name__} for embeddings")
+        return cls(
+            provider=provider,
+            cache_size=int(os.environ.get("EMBEDDING_CACHE_SIZE", 4096)),
+            batch_size=int(os.environ.get("EMBEDDING_BATCH_SIZE", 64)),
+        )
+
+    @property
+    def match_threshold(self) -> float:
+        return self.provider.match_threshold
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed many texts, returning a (len(texts), dim) float32 array."""
+        keys = [normalize_text(text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, vector in zip(keys, vectors) if vector is None))
+        computed = {}
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            for key, vector in zip(batch, self.provider.embed_batch(batch)):
+                computed[key] = vector
+                self.cache.set(key, vector)
+        rows = [vector if vector is not None else computed[key] for key, vector in zip(keys, vectors)]
+        return np.vstack(rows) if rows else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_batch([text])[0]
+
+    async def aembed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        # Local providers finish in microseconds; remote ones would block the event loop
+        if self.provider.local:
+            return self.embed_batch(texts)
+        return await asyncio.to_thread(self.embed_batch, texts)
+
+    async def aembed(self, text: str) -> np.ndarray:
+        return (await self.aembed_batch([text]))[0]
+
+
+# Shared engine used by the RAG manager and the ingestion script
+embedding_engine = EmbeddingEngine.from_env()
@@ -0,0 +1,127 @@
+import re
+import json
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Used when neither the user nor the model supplies a usable wallet
+DEFAULT_WALLET_ADDRESS = "0x1f9090aaE28b8a3dCeaDf281B0F12828e676c326"
+# Addresses the model copies from tool examples instead of the real wallet
+PLACEHOLDER_ADDRESSES = frozenset({"USER_ADDRESS", "0xABCDEF1234567890abcdef1234567890ABCDEF12"})
+
+VALUE_START = re.compile(r"[\[{]")
+MAX_DEPTH = 4
+
+_decoder = json.JSONDecoder()
+
+
+def _iter_json_values(text: str) -> Iterator[Any]:
+    """
+    Every top-level JSON value embedded in text, left to right. Prose, code fences and a truncated
+    tail are skipped; a value that fails to decode is retried from its next character, so the
+    complete calls of a cut-off array are still found.
+    """
+    stripped = text.strip()
+    if stripped.startswith('"'):
+        # A quoted JSON string such as "{\"name\": ...}" holds the real payload
+        try:
+            value = json.loads(stripped)
+        except ValueError:
+            pass
+        else:
+            if isinstance(value, str):
+                yield value
+                return
+
+    position = 0
+    length = len(text)
+    while position < length:
+        match = VALUE_START.search(text, position)
+        if match is None:
+            return
+        start = match.start()
+        try:
+            value, position = _decoder.raw_decode(text, start)
+        except ValueError:
+            position = start + 1
+            continue
+        yield value
+
+
+def _unescape(text: str) -> str:
+    """JSON that was escaped without being quoted, e.g. {\\"name\\": ...}."""
+    return text.replace('\\"', '"').replace('\\\\', '\\')
+
+
+def _iter_calls(value: Any, depth: int = 0) -> Iterator[Dict]:
+    if depth > MAX_DEPTH:
+        return
+    if isinstance(value, dict):
+        if isinstance(value.get("tool_calls"), list):
+            yield from _iter_calls(value["tool_calls"], depth + 1)
+        else:
+            yield value
+    elif isinstance(value, list):
+        if value and all(isinstance(item, str) for item in value):
+            # Streamed token chunks only parse once joined; whole JSON strings still scan one by one
+            yield from _iter_calls("".join(value), depth + 1)
+        else:
+            for item in value:
+                yield from _iter_calls(item, depth + 1)
+    elif isinstance(value, str):
+        found = False
+        for item in _iter_json_values(value):
+            found = True
+            yield from _iter_calls(item, depth + 1)
+        if not found and '\\"' in value:
+            for item in _iter_json_values(_unescape(value)):
+                yield from _iter_calls(item, depth + 1)
+
+
+def _normalize_call(call: Dict, wallet_address: Optional[str]) -> Optional[Dict]:
+    function = call.get("function")
+    if isinstance(function, dict):
+        name = function.get("name")
+        arguments = function.get("arguments", {})
+    else:
+        name = call.get("name")
+        arguments = call.get("arguments", call.get("parameters", {}))
+    if not isinstance(name, str) or not name:
+        return None
+
+    if isinstance(arguments, str):
+        try:
+            arguments = json.loads(arguments) if arguments.strip() else {}
+        except ValueError:
+            logger.debug(f"Unparseable arguments for {name}: {arguments[:100]}")
+            arguments = {}
+    parameters = dict(arguments) if isinstance(arguments, dict) else {}
+
+    # The user's wallet always wins; the model's value is only kept when the user gave none
+    if wallet_address:
+        parameters["wallet_address"] = wallet_address
+    elif "wallet_address" in parameters:
+        model_address = parameters["wallet_address"]
+        if not isinstance(model_address, str) or not model_address or model_address in PLACEHOLDER_ADDRESSES:
+            parameters["wallet_address"] = DEFAULT_WALLET_ADDRESS
+    return {"name": name, "parameters": parameters}
+
+
+def parse_tool_calls(result: Any, wallet_address: Optional[str] = None) -> List[Dict]:
+    """
+    Normalize a Flock IO response to [{"name": ..., "parameters": {...}}] in one pass.
+    Accepts every shape the model produces: a list of strings or objects, a JSON array or object
+    inside prose, an escaped or quoted JSON string, OpenAI-style {"type": "function", "function": ...}
+    objects, {"tool_calls": [...]} messages and bare {"name", "arguments" | "parameters"} objects.
+    """
+    if not result:
+        return []
+    calls = []
+    for call in _iter_calls(result):
+        normalized = _normalize_call(call, wallet_address)
+        if normalized is not None:
+            calls.append(normalized)
+    if not calls:
+        logger.debug(f"No tool calls in Flock response: {str(result)[:200]}")
+    return calls
@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import math
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INTENTS = ["tool_call", "rag", "general"]
+
+ETH_ADDRESS_PATTERN = re.compile(r'0x[a-fA-F0-9]{40}')
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+# Keyword rules for each wallet tool, matched against the lowercased message
+TOOL_PATTERNS = {
+    "get_wallet_networth": re.compile(r"\b(net ?worth|worth|how rich|how much (money|value)|balance|total value)\b"),
+    "get_wallet_age": re.compile(r"\b(how old|wallet age|age of|first transaction|created|since when)\b"),
+    "get_portfolio_holdings": re.compile(r"\b(holdings?|portfolio|top token|biggest (token|position)|what tokens?|which tokens?)\b"),
+    "get_pnl": re.compile(r"\b(pnl|profit|loss|losses|gains?|trades|trading)\b"),
+    "get_ens": re.compile(r"\b(ens|domain|\.eth)\b"),
+}
+
+# References to the player's own wallet (or an explicit address) make a tool call likely
+WALLET_REFERENCE_PATTERN = re.compile(r"\b(my|mine|our)\b|\b(this|that|the|his|her|their) (wallet|address|account|portfolio)\b")
+
+FACTUAL_PATTERN = re.compile(
+    r"^\s*(what is|what are|what's|whats|what does|how does|how do|how is|why is|why do|explain|define|"
+    r"tell me about|describe|meaning of|difference between)\b"
+)
+
+GREETING_PATTERN = re.compile(
+    r"^\s*(hi+|hello+|hey+|greetings|good (morning|evening|afternoon|day)|yo|sup|"
+    r"thanks?( you)?|thank you|ty|lol+|haha+|ok(ay)?|cool|nice|bye|goodbye|who are you|"
+    r"where am i|what should i do)\b[\s!.?]*$"
+)
+
+
+class IntentPrediction(NamedTuple):
+    intent: str
+    confidence: float
+    tools: List[str]
+    source: str
+
+
+class NaiveBayesIntentModel:
+    """Multinomial naive Bayes over word unigrams and bigrams, stored as a small JSON file."""
+
+    def __init__(self, log_priors: Dict[str, float], log_likelihoods: Dict[str, Dict[str, float]],
+                 log_unknown: Dict[str, float]):
+        self.log_priors = log_priors
+        self.log_likelihoods = log_likelihoods
+        self.log_unknown = log_unknown
+
+    @staticmethod
+    def features(message: str) -> List[str]:
+        tokens = TOKEN_PATTERN.findall(message.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    @classmethod
+    def train(cls, examples: Iterable[Tuple[str, str]], alpha: float = 1.0) -> "NaiveBayesIntentModel":
+        class_counts: Counter = Counter()
+        feature_counts: Dict[str, Counter] = {}
+        vocabulary = set()
+        for message, intent in examples:
+            class_counts[intent] += 1
+            features = cls.features(message)
+            feature_counts.setdefault(intent, Counter()).update(features)
+            vocabulary.update(features)
+
+        total = sum(class_counts.values())
+        log_priors = {intent: math.log(count / total) for intent, count in class_counts.items()}
+        log_likelihoods = {}
+        log_unknown = {}
+        for intent, counts in feature_counts.items():
+            denominator = sum(counts.values()) + alpha * (len(vocabulary) + 1)
+            log_likelihoods[intent] = {
+                feature: math.log((count + alpha) / denominator) for feature, count in counts.items()
+            }
+            log_unknown[intent] = math.log(alpha / denominator)
+        return cls(log_priors, log_likelihoods, log_unknown)
+
+    def predict(self, message: str) -> Tuple[str, float]:
+        """Return the most likely intent and its posterior probability."""
+        features = self.features(message)
+        scores = {}
+        for intent, log_prior in self.log_priors.items():
+            likelihoods = self.log_likelihoods[intent]
+            unknown = self.log_unknown[intent]
+            scores[intent] = log_prior + sum(likelihoods.get(feature, unknown) for feature in features)
+
+        best_score = max(scores.values())
+        normaliser = sum(math.exp(score - best_score) for score in scores.values())
+        best_intent = max(scores, key=scores.get)
+        return best_intent, 1.0 / normaliser
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({
+                "log_priors": self.log_priors,
+                "log_likelihoods": self.log_likelihoods,
+                "log_unknown": self.log_unknown,
+            }, f)
+
+    @classmethod
+    def load(cls, path: str) -> "NaiveBayesIntentModel":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["log_priors"], data["log_likelihoods"], data["log_unknown"])
+
+
+class IntentClassifier:
+    """
+    In-process intent classifier that handles the common cases without calling the Flock model.
+    Keyword/regex rules run first; an optional naive Bayes model covers the rest. Predictions below
+    `confidence_threshold` should be sent to the LLM instead.
+    """
+
+    def __init__(self, model: Optional[NaiveBayesIntentModel] = None, confidence_threshold: float = 0.8):
+        self.model = model
+        self.confidence_threshold = confidence_threshold
+
+    @classmethod
+    def from_env(cls) -> "IntentClassifier":
+        model = None
+        model_path = os.environ.get("INTENT_MODEL_PATH")
+        if model_path and os.path.isfile(model_path):
+            try:
+                model = NaiveBayesIntentModel.load(model_path)
+                logger.info(f"Loaded intent model from {model_path}")
+            except Exception as e:
+                logger.error(f"Error loading intent model from {model_path}: {e}")
+        return cls(model=model, confidence_threshold=float(os.environ.get("INTENT_CONFIDENCE_THRESHOLD", 0.8)))
+
+    def detect_tools(self, message_lower: str) -> List[str]:
+        return [name for name, pattern in TOOL_PATTERNS.items() if pattern.search(message_lower)]
+
+    def classify(self, message: str, wallet_address: str = None) -> IntentPrediction:
+        message_lower = message.lower().strip()
+        has_address = bool(wallet_address) or bool(ETH_ADDRESS_PATTERN.search(message))
+        tools = self.detect_tools(message_lower)
+        refers_to_wallet = bool(ETH_ADDRESS_PATTERN.search(message)) or bool(WALLET_REFERENCE_PATTERN.search(message_lower))
+
+        if tools and refers_to_wallet and has_address:
+            return IntentPrediction("tool_call", 0.95, tools, "rules")
+
+        if GREETING_PATTERN.match(message_lower):
+            return IntentPrediction("general", 0.95, [], "rules")
+
+        if FACTUAL_PATTERN.match(message_lower) and not refers_to_wallet:
+            return IntentPrediction("rag", 0.9, [], "rules")
+
+        if self.model is not None:
+            intent, probability = self.model.predict(message)
+            if intent == "tool_call":
+                # The model cannot pick tools, so only trust it when the rules found some to call
+                if not (tools and has_address):
+                    probability = min(probability, self.confidence_threshold / 2)
+            return IntentPrediction(intent, probability, tools, "model")
+
+        if tools:
+            return IntentPrediction("tool_call", 0.5, tools, "rules")
+        if not refers_to_wallet and len(message_lower.split()) <= 3:
+            return IntentPrediction("general", 0.6, [], "rules")
+        return IntentPrediction("general", 0.3, [], "rules")
+
+    def is_confident(self, prediction: IntentPrediction) -> bool:
+        return prediction.confidence >= self.confidence_threshold
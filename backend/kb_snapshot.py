@@ -0,0 +1,183 @@
+import os
+import json
+import mmap
+import time
+import shutil
+import logging
+from typing import Dict, Optional, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Snapshot layout inside the snapshot directory:
+#   CURRENT                  name of the live version, replaced atomically
+#   v000001/manifest.json    version, row count, dimension, source, creation time
+#   v000001/embeddings.f32   row-normalized float32 matrix, row-major, count x dim
+#   v000001/documents.i64    int64 rows of (id, title_start, title_end, content_start, content_end)
+#   v000001/text.bin         UTF-8 titles and contents addressed by the byte offsets above
+# and, when the snapshot carries a BM25 index (see BM25Index.arrays()):
+#   v000001/bm25_terms.txt   the vocabulary, one term per line in posting-list order
+#   v000001/bm25_offsets.i64 start of each term's postings, plus the total as a final entry
+#   v000001/bm25_idf.f32     inverse document frequency per term
+#   v000001/bm25_docs.i64    document row of every posting
+#   v000001/bm25_scores.f32  BM25 contribution of every posting
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+DOCUMENTS_FILE = "documents.i64"
+TEXT_FILE = "text.bin"
+BM25_TERMS_FILE = "bm25_terms.txt"
+BM25_OFFSETS_FILE = "bm25_offsets.i64"
+BM25_IDF_FILE = "bm25_idf.f32"
+BM25_DOCS_FILE = "bm25_docs.i64"
+BM25_SCORES_FILE = "bm25_scores.f32"
+
+
+def current_version(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_bm25(path: str, bm25: Dict) -> Dict:
+    """Write BM25Index.arrays() into a snapshot version and return its manifest entry."""
+    with open(os.path.join(path, BM25_TERMS_FILE), "w", encoding="utf-8") as f:
+        f.write("\n".join(bm25["terms"]))
+    np.asarray(bm25["offsets"], dtype=np.int64).tofile(os.path.join(path, BM25_OFFSETS_FILE))
+    np.asarray(bm25["idf"], dtype=np.float32).tofile(os.path.join(path, BM25_IDF_FILE))
+    np.asarray(bm25["doc_indices"], dtype=np.int64).tofile(os.path.join(path, BM25_DOCS_FILE))
+    np.asarray(bm25["contributions"], dtype=np.float32).tofile(os.path.join(path, BM25_SCORES_FILE))
+    return {"terms": len(bm25["terms"]), "postings": len(bm25["doc_indices"]), "k1": bm25["k1"]}
+
+
+def read_array(path: str, dtype, count: int) -> np.ndarray:
+    # np.memmap cannot map an empty file
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,)) if count else np.zeros(0, dtype=dtype)
+
+
+def write_snapshot(directory: str, ids: Sequence[int], titles: Sequence[str], contents: Sequence[str],
+                   embeddings: np.ndarray, source: str = "db", keep: int = 3, bm25: Optional[Dict] = None) -> str:
+    """
+    Write a new snapshot version and make it current. Readers only ever see complete versions:
+    files are written to a fresh directory first and CURRENT is swapped with an atomic rename.
+    `bm25` is BM25Index.arrays() for the same documents, so workers can map the lexical index
+    instead of rebuilding it. Returns the new version name.
+    """
+    os.makedirs(directory, exist_ok=True)
+    versions = sorted(name for name in os.listdir(directory) if name.startswith("v") and name[1:].isdigit())
+    version = f"v{int(versions[-1][1:]) + 1 if versions else 1:06d}"
+    path = os.path.join(directory, version)
+    os.makedirs(path)
+
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1.0, norms)
+
+    documents = np.zeros((len(ids), 5), dtype=np.int64)
+    with open(os.path.join(path, TEXT_FILE), "wb") as text_file:
+        offset = 0
+        for row, (doc_id, title, content) in enumerate(zip(ids, titles, contents)):
+            title_bytes, content_bytes = title.encode("utf-8"), content.encode("utf-8")
+            text_file.write(title_bytes)
+            text_file.write(content_bytes)
+            title_end = offset + len(title_bytes)
+            documents[row] = (doc_id, offset, title_end, title_end, title_end + len(content_bytes))
+            offset = title_end + len(content_bytes)
+
+    np.ascontiguousarray(matrix).tofile(os.path.join(path, EMBEDDINGS_FILE))
+    documents.tofile(os.path.join(path, DOCUMENTS_FILE))
+    manifest = {
+        "version": version,
+        "count": len(ids),
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "source": source,
+        "created_at": time.time(),
+    }
+    if bm25 is not None:
+        manifest["bm25"] = write_bm25(path, bm25)
+    with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+
+    temp_current = os.path.join(directory, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(temp_current, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_current, os.path.join(directory, CURRENT_FILE))
+
+    # Workers still mapping an old version keep it readable after deletion, so pruning is safe
+    for old_version in versions[:max(len(versions) + 1 - keep, 0)]:
+        shutil.rmtree(os.path.join(directory, old_version), ignore_errors=True)
+    return version
+
+
+class SnapshotDocuments:
+    """Sequence view over the snapshot documents that decodes title and content on access."""
+
+    def __init__(self, documents: np.ndarray, text: mmap.mmap):
+        self._documents = documents
+        self._text = text
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __getitem__(self, index) -> Dict:
+        doc_id, title_start, title_end, content_start, content_end = (int(value) for value in self._documents[int(index)])
+        return {
+            "id": doc_id,
+            "title": self._text[title_start:title_end].decode("utf-8"),
+            "content": self._text[content_start:content_end].decode("utf-8"),
+        }
+
+
+class KnowledgeSnapshot:
+    """
+    One snapshot version opened with read-only memory maps. Every worker that opens the same
+    version shares the same physical pages through the OS page cache, so the matrix is not copied.
+    `bm25` holds the mapped BM25Index.from_arrays() arguments, or None for snapshots written
+    without them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest["version"]
+        count, dim = self.manifest["count"], self.manifest["dim"]
+
+        if count:
+            self.matrix = np.memmap(os.path.join(path, EMBEDDINGS_FILE), dtype=np.float32, mode="r", shape=(count, dim))
+            documents = np.memmap(os.path.join(path, DOCUMENTS_FILE), dtype=np.int64, mode="r", shape=(count, 5))
+        else:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+            documents = np.zeros((0, 5), dtype=np.int64)
+        self.ids = documents[:, 0]
+
+        with open(os.path.join(path, TEXT_FILE), "rb") as f:
+            # mmap cannot map an empty file
+            text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        self.documents = SnapshotDocuments(documents, text)
+        self.bm25 = self._open_bm25(self.manifest.get("bm25"), count)
+
+    def _open_bm25(self, entry: Optional[Dict], count: int) -> Optional[Dict]:
+        if entry is None:
+            return None
+        terms, postings = entry["terms"], entry["postings"]
+        with open(os.path.join(self.path, BM25_TERMS_FILE), encoding="utf-8") as f:
+            vocabulary = f.read().split("\n") if terms else []
+        return {
+            "terms": vocabulary,
+            "offsets": read_array(os.path.join(self.path, BM25_OFFSETS_FILE), np.int64, terms + 1),
+            "idf": read_array(os.path.join(self.path, BM25_IDF_FILE), np.float32, terms),
+            "doc_indices": read_array(os.path.join(self.path, BM25_DOCS_FILE), np.int64, postings),
+            "contributions": read_array(os.path.join(self.path, BM25_SCORES_FILE), np.float32, postings),
+            "count": count,
+            "k1": entry["k1"],
+        }
+
+    @classmethod
+    def open_current(cls, directory: str) -> Optional["KnowledgeSnapshot"]:
+        version = current_version(directory)
+        return cls(os.path.join(directory, version)) if version else None
@@ -0,0 +1,174 @@
+import os
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+from dotenv import load_dotenv
+import replicate
+from replicate.exceptions import ReplicateError
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+if os.path.isfile('.env'):
+    load_dotenv()
+elif os.path.isfile('../.env'):
+    load_dotenv('../.env')
+
+FLOCK_MODEL = "vatsalkshah/flock-web3-foundation-model:3babfa32ab245cf8e047ff7366bcb4d5a2b4f0f108f504c47d5a84e23c02ff5f"
+
+
+class LLMQueueFullError(Exception):
+    """Raised when too many calls are already waiting for a free generation slot."""
+
+
+class LLMTimeoutError(Exception):
+    """Raised when a call does not finish within its timeout."""
+
+
+class ReplicateBackend:
+    """Calls Replicate through its async API, so generations never block the event loop."""
+
+    async def run(self, model: str, input: Dict) -> Any:
+        return await replicate.async_run(model, input=input)
+
+    async def stream(self, model: str, input: Dict) -> AsyncIterator[str]:
+        try:
+            events = replicate.async_stream(model, input=input)
+            first_event = await anext(events)
+        except ReplicateError as e:
+            # Model versions without streaming support still work, as a single chunk
+            logger.warning(f"Streaming unavailable, falling back to a single response: {e}")
+            yield output_to_text(await self.run(model, input))
+            return
+        except StopAsyncIteration:
+            return
+
+        if str(first_event):
+            yield str(first_event)
+        async for event in events:
+            # Only output events carry text; start/done events stringify to ""
+            if str(event):
+                yield str(event)
+
+
+class FakeBackend:
+    """
+    Local stand-in for the Flock model, used for offline runs and load tests.
+    Tool detection requests get an empty tool list, everything else a canned reply.
+    """
+
+    def __init__(self, response: str = None, latency: float = 0.5, token_delay: float = 0.02):
+        self.response = response or (
+            "Ah, a curious traveler! The ledger remembers all who ask. "
+            "What quest brings you to my tower today?"
+        )
+        self.latency = latency
+        self.token_delay = token_delay
+
+    def _reply(self, input: Dict) -> str:
+        if input.get("tools", "[]") != "[]":
+            return "[]"
+        return self.response
+
+    async def run(self, model: str, input: Dict) -> Any:
+        await asyncio.sleep(self.latency)
+        return self._reply(input)
+
+    async def stream(self, model: str, input: Dict) -> AsyncIterator[str]:
+        await asyncio.sleep(self.latency)
+        for word in self._reply(input).split(" "):
+            await asyncio.sleep(self.token_delay)
+            yield word + " "
+
+
+def output_to_text(output: Any) -> str:
+    """Replicate returns either a string or a list of string chunks."""
+    if isinstance(output, list):
+        return "".join(str(chunk) for chunk in output)
+    return str(output)
+
+
+class LLMClient:
+    """
+    Shared async gateway for every LLM call in the backend.
+    At most `max_concurrency` generations run at once and at most `max_queue` more may wait for a slot;
+    beyond that calls are rejected immediately instead of piling up. Each call has a timeout that
+    covers both the wait for a slot and the generation itself.
+    """
+
+    def __init__(self, backend=None, max_concurrency: int = 16, max_queue: int = 64, timeout: float = 60.0):
+        self.backend = backend or ReplicateBackend()
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._active = 0
+
+    @classmethod
+    def from_env(cls) -> "LLMClient":
+        backend_name = os.environ.get("LLM_BACKEND", "replicate")
+        backend = FakeBackend() if backend_name == "fake" else ReplicateBackend()
+        return cls(
+            backend=backend,
+            max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", 16)),
+            max_queue=int(os.environ.get("LLM_MAX_QUEUE", 64)),
+            timeout=float(os.environ.get("LLM_TIMEOUT", 60)),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {"active": self._active, "waiting": self._waiting, "max_concurrency": self.max_concurrency}
+
+    async def _acquire(self, deadline: float) -> None:
+        if self._waiting >= self.max_queue:
+            raise LLMQueueFullError(f"LLM queue is full ({self._waiting} calls waiting)")
+        self._waiting += 1
+        try:
+            remaining = deadline - asyncio.get_running_loop().time()
+            await asyncio.wait_for(self._slots.acquire(), timeout=max(remaining, 0))
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError("Timed out waiting for a free LLM slot")
+        finally:
+            self._waiting -= 1
+        self._active += 1
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._slots.release()
+
+    async def run(self, input: Dict, model: str = FLOCK_MODEL, timeout: Optional[float] = None) -> Any:
+        """Run one generation and return the raw model output."""
+        timeout = timeout or self.timeout
+        deadline = asyncio.get_running_loop().time() + timeout
+        await self._acquire(deadline)
+        try:
+            remaining = deadline - asyncio.get_running_loop().time()
+            return await asyncio.wait_for(self.backend.run(model, input), timeout=max(remaining, 0))
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"LLM call timed out after {timeout}s")
+        finally:
+            self._release()
+
+    async def stream(self, input: Dict, model: str = FLOCK_MODEL, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield generated text chunks as the model produces them."""
+        timeout = timeout or self.timeout
+        deadline = asyncio.get_running_loop().time() + timeout
+        await self._acquire(deadline)
+        chunks = self.backend.stream(model, input)
+        try:
+            while True:
+                remaining = deadline - asyncio.get_running_loop().time()
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), timeout=max(remaining, 0))
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise LLMTimeoutError(f"LLM stream timed out after {timeout}s")
+                yield chunk
+        finally:
+            await chunks.aclose()
+            self._release()
+
+
+# Shared client used by the chat endpoints and the RAG manager
+llm_client = LLMClient.from_env()
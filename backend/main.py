@@ -1,16 +1,24 @@
 # main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from transformers import AutoModelForCausalLM, AutoTokenizer
-from moralis_api import get_wallet_information
+from moralis_api import async_get_wallet_information, batch_lane
 from venice import generate_character_traits, remove_background, generate_image_prompt, generate_character_image
 from supabase_api import upload_image
+from db import db
 from conversation_manager import ConversationManager
 from rag_manager import RAGManager
-import os, random, logging
+from pipeline import StageGraph
+from llm_client import llm_client, output_to_text, LLMQueueFullError
+from embeddings import embedding_engine
+from response_cache import SemanticResponseCache
+from prompt_builder import PromptBuilder, PromptSection
+from avatar_jobs import AvatarJobQueue, JobQueueFullError, create_job_store
+import os, random, logging, json, time, asyncio
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
-import replicate
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -45,14 +53,49 @@ conversation_manager = ConversationManager(max_history_turns=5)
 # Initialize RAG manager
 rag_manager = RAGManager(max_results=3)
 
+# Reuses replies to near-identical opening questions of a session (set RESPONSE_CACHE=false to disable)
+CACHEABLE_INTENTS = ("rag", "general")
+response_cache = SemanticResponseCache.from_env() if os.environ.get("RESPONSE_CACHE", "true").lower() == "true" else None
+
+# Token budgets for the context sections of the Niloy prompt, highest priority first
+prompt_builder = PromptBuilder.from_env([
+    PromptSection("tools", budget=300),
+    PromptSection("knowledge", budget=400, header="Relevant knowledge from the blockchain realm:\n\n"),
+    PromptSection("history", budget=400, separator="\n\n", keep_latest=True),
+    PromptSection("concepts", budget=80, header="You have learned about: ", footer=".", separator=", ",
+                  keep_latest=True, empty_text="You haven't explored any concepts yet."),
+])
+
+RANDOM_RESPONSES = [
+    "Hmm, I'm not sure what you mean. Can you provide more details?",
+    "Yes",
+    "No",
+    "I'm not sure",
+    "I don't know",
+]
+
+def niloy_model_input(query: str) -> Dict:
+    return {
+        "top_p": 0.9,
+        "temperature": 0.7,
+        "max_new_tokens": 500,
+        "query": query,
+        "tools": "[]",
+    }
+
 class ChatRequest(BaseModel):
     message: str
     session_id: str = "default"
     wallet_address: str = None
+    # Set to false to always generate a fresh reply
+    use_cache: bool = True
 
 class AddressRequest(BaseModel):
     address: str
 
+class BatchAddressRequest(BaseModel):
+    addresses: List[str]
+
 class AvatarRequest(BaseModel):
     address: str
     sex: str
@@ -62,202 +105,427 @@ class AvatarRequest(BaseModel):
 def ping():
     return {"status": "ok"}
 
-@app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
-    try:
-        if not IS_USE_MODEL:
-            random_responses = [
-                "Hmm, I'm not sure what you mean. Can you provide more details?",
-                "Yes",
-                "No",
-                "I'm not sure",
-                "I don't know",
-            ]
-            response = random.choice(random_responses)
-            return {"response": response}
-
-        # Get conversation history and learned concepts
-        history = await conversation_manager.get_conversation_history(request.session_id)
-        learned_concepts = await conversation_manager.get_learned_concepts(request.session_id)
-        
-        # Detect concepts in the current message
-        detected_concepts = conversation_manager.detect_concepts_in_message(request.message)
-        
-        # Format conversation history and learned concepts for the prompt
-        formatted_history = conversation_manager.format_conversation_history(history)
-        formatted_concepts = conversation_manager.format_learned_concepts(learned_concepts)
+@app.get("/tools/stats")
+def tool_stats():
+    """Per-tool call counts, latency and Moralis compute units since startup."""
+    return rag_manager.tools.stats()
+
+def build_chat_graph(request: ChatRequest, detected_concepts: List[str]) -> StageGraph:
+    """
+    Build the stages that gather context for a chat turn and end in the Niloy prompt.
+    History, learned concepts and intent classification are independent, so they run concurrently.
+    Only the knowledge/tool lookup waits on the intent, and the prompt waits on everything.
+    """
+    graph = StageGraph("chat")
+
+    async def load_history(_):
+        return await conversation_manager.get_prompt_history(request.session_id)
 
+    async def load_learned_concepts(_):
+        return await conversation_manager.get_learned_concepts(request.session_id)
+
+    async def classify_intent(_):
         # Classify user intent and get appropriate action
-        intent_type, action_data = await rag_manager.classify_user_intent(
-            request.message, 
-            request.wallet_address
-        )
-        
-        # Initialize knowledge and tool results
-        knowledge_text = ""
-        tool_results_text = ""
-        
+        return await rag_manager.classify_user_intent(request.message, request.wallet_address)
+
+    async def gather_context(inputs):
+        intent_type, action_data = inputs["intent"]
+        knowledge_entries = []
+        tool_entries = []
+        knowledge_ids = []
+
         # Handle different intents
         if intent_type == "rag":
             # Search knowledge base for relevant information
             knowledge = await rag_manager.search_knowledge_base(action_data["query"])
-            knowledge_text = rag_manager.format_knowledge_for_prompt(knowledge)
+            knowledge_entries = rag_manager.format_knowledge_entries(knowledge)
+            knowledge_ids = [item["id"] for item in knowledge]
             logger.info(f"RAG search results: {len(knowledge)} items found")
-        
+
         elif intent_type == "tool_call":
-            # Execute tool calls
-            tool_results = []
+            # Execute tool calls concurrently, each bounded by its own deadline
             for tool in action_data["tools"]:
                 # Log the tool and its parameters
                 logger.info(f"Executing tool: {tool['name']} with parameters: {tool['parameters']}")
-                result = await rag_manager.execute_tool_call(tool)
-                tool_results.append(result)
-            
+            tool_results = await rag_manager.execute_tool_calls(action_data["tools"])
+
             # Format tool results for the prompt
             for result in tool_results:
                 formatted_result = rag_manager.format_tool_result_for_prompt(result)
-                tool_results_text += formatted_result + "\n"
+                tool_entries.append(formatted_result)
                 logger.info(f"Tool result: {formatted_result[:100]}...")
-            
+
             logger.info(f"Tool call results: {len(tool_results)} tools executed")
 
+        return knowledge_entries, tool_entries, knowledge_ids
+
+    async def lookup_cached_response(inputs):
+        # Only knowledge and small-talk replies are reusable; tool replies depend on live wallet data.
+        # A reply to a turn with history depends on that conversation, which the key does not cover.
+        intent_type, _ = inputs["intent"]
+        if response_cache is None or not request.use_cache or intent_type not in CACHEABLE_INTENTS:
+            return None
+        if inputs["history"]["turns"] or inputs["history"]["summary"]:
+            return None
+        _, _, knowledge_ids = inputs["context"]
+        embedding = await embedding_engine.aembed(request.message)
+        context_key = response_cache.context_key(inputs["learned_concepts"], knowledge_ids)
+        return {
+            "embedding": embedding,
+            "context_key": context_key,
+            "response": response_cache.lookup(embedding, context_key)
+        }
+
+    async def build_prompt(inputs):
+        intent_type, _ = inputs["intent"]
+        knowledge_entries, tool_entries, _ = inputs["context"]
+
         logger.info(f"Query: {request.message}")
         logger.info(f"Wallet address: {request.wallet_address}")
-        logger.info(f"Learned concepts: {formatted_concepts}")
-        logger.info(f"History: {formatted_history}")
         logger.info(f"Detected concepts: {detected_concepts}")
         logger.info(f"Intent type: {intent_type}")
-        
-        query = f"""You are Niloy, the wise and ancient wizard of Aetheria — a mystical land where blockchain knowledge is discovered through quests and adventure. You are a kind, patient, and knowledgeable guide who helps players understand both the world and the magic that powers it: the blockchain. You speak in a mystical, old-world tone, but you always explain things clearly and simply, as if speaking to a curious beginner.
-
-            You reside in the Tower of Lore and serve as the guardian of the Ledger of Truth. You welcome newcomers to Aetheria and guide them through their journey, answering their questions with warmth, stories, and metaphors. You remember many ages of magic and have taught countless travelers before.
-
-            {formatted_concepts}
 
-            Previous conversation:
-            {formatted_history}
+        return build_niloy_prompt(request.message, {
+            "tools": tool_entries,
+            "knowledge": knowledge_entries,
+            "history": conversation_manager.format_history_entries(
+                inputs["history"]["turns"],
+                inputs["history"]["summary"]
+            ),
+            "concepts": inputs["learned_concepts"],
+        })
+
+    graph.add_stage("history", load_history)
+    graph.add_stage("learned_concepts", load_learned_concepts)
+    graph.add_stage("intent", classify_intent)
+    graph.add_stage("context", gather_context, depends_on=["intent"])
+    graph.add_stage("prompt", build_prompt, depends_on=["intent", "history", "learned_concepts", "context"])
+    graph.add_stage("cache", lookup_cached_response, depends_on=["intent", "history", "learned_concepts", "context"])
+    return graph
+
+def store_cached_response(cache_lookup: Optional[Dict], output) -> None:
+    if cache_lookup is not None and cache_lookup["response"] is None:
+        response_cache.store(cache_lookup["embedding"], cache_lookup["context_key"], output)
+
+async def persist_chat_turn(request: ChatRequest, output: str, detected_concepts: List[str]) -> None:
+    # Save the conversation turn
+    await conversation_manager.save_conversation_turn(
+        request.session_id,
+        request.message,
+        output
+    )
+
+    # Mark detected concepts as learned
+    await conversation_manager.mark_concepts_learned(request.session_id, detected_concepts)
 
-            {knowledge_text}
-
-            {tool_results_text}
+@app.post("/chat")
+async def chat_endpoint(request: ChatRequest, response: Response):
+    try:
+        if not IS_USE_MODEL:
+            return {"response": random.choice(RANDOM_RESPONSES)}
 
-            Constraints and Style Guide:
-            - Always prioritize responding directly to the player's question or statement first.
-            - Keep responses brief and engaging: no more than 80 words unless clarity demands it.
-            - Use short paragraphs and natural dialogue pacing.
-            - Do not explain too much at once — share just enough to intrigue or guide.
-            - Use vivid fantasy RPG metaphors to explain technical ideas. (e.g., "A wallet is like a soulbound crystal.")
-            - Avoid unexplained technical terms — always simplify or use analogy.
-            - Stay fully in character. You are not a chatbot; you are Niloy.
-            - Never use programming language (no code, JSON, arrays, or syntax). Never put anything in square brackets.
-            - Speak in English with warmth and clarity, and a mystical tone. Never use any other languages.
-            - Encourage curiosity. End with a question, gentle riddle, or prompt for further exploration.
-            - Reference previously learned concepts when relevant to build upon user knowledge.
-            - Occasionally give lore-based quests or tests to reinforce understanding.
+        # Detect concepts in the current message
+        detected_concepts = conversation_manager.detect_concepts_in_message(request.message)
+        graph = build_chat_graph(request, detected_concepts)
 
-            You are also allowed to:
-            - Explain who you are or what your role is in the world.
-            - Describe Aetheria in fantasy terms when asked.
-            - Offer setting-based context like where the user is, who they are, or what lies ahead.
+        async def generate(inputs):
+            cache_lookup = inputs["cache"]
+            if cache_lookup is not None and cache_lookup["response"] is not None:
+                return output_to_text(cache_lookup["response"])
+            # Replicate may return a list of chunks; the cache, the stored turn and the reply all get text, as in /chat/stream
+            output = output_to_text(await llm_client.run(niloy_model_input(inputs["prompt"])))
+            store_cached_response(cache_lookup, output)
+            return output
 
-            If the user says something idle or whimsical (e.g., "I like turtles", "hello", "lol"), respond with humor and curiosity, while gently guiding them back to their quest.
+        async def persist(inputs):
+            await persist_chat_turn(request, inputs["generate"], detected_concepts)
 
-            Tone examples:
-            - "Ah, a fine question indeed. Imagine the blockchain as a concotion made by every mage in the realm…"
-            - "Curious you ask that, traveler. A wallet, you see, is not made of leather—but of light and legend."
+        graph.add_stage("generate", generate, depends_on=["prompt", "cache"])
+        graph.add_stage("persist", persist, depends_on=["generate"])
 
-            Now respond to this message:
-            User: {request.message}
-            Niloy: 
-"""
+        results = await graph.run()
+        response.headers["Server-Timing"] = graph.server_timing_header()
 
-        output = replicate.run(
-            "vatsalkshah/flock-web3-foundation-model:3babfa32ab245cf8e047ff7366bcb4d5a2b4f0f108f504c47d5a84e23c02ff5f",
-            input={
-                "top_p": 0.9,
-                "temperature": 0.7,
-                "max_new_tokens": 500,
-                "query": query,
-                "tools": "[]",
-            }
-        )
-        
-        # Save the conversation turn
-        await conversation_manager.save_conversation_turn(
-            request.session_id,
-            request.message,
-            output
-        )
-        
-        # Mark detected concepts as learned
-        for concept in detected_concepts:
-            await conversation_manager.mark_concept_learned(request.session_id, concept)
-        
+        output = results["generate"]
         logger.info(f"API Output: {output}")
         return {"response": output}
+    except LLMQueueFullError as e:
+        logger.warning(f"Rejecting chat request: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def format_sse(event: str, data: Dict) -> str:
+    """Encode one Server-Sent Event. Data is JSON so tokens containing newlines stay intact."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Streaming variant of /chat. Emits Server-Sent Events:
+    `token` for every generated chunk, then `done` with the full response, or `error`.
+    The turn is saved and concepts are marked before the `done` event is sent.
+    """
+    async def event_stream():
+        if not IS_USE_MODEL:
+            output = random.choice(RANDOM_RESPONSES)
+            yield format_sse("token", {"token": output})
+            yield format_sse("done", {"response": output})
+            return
+
+        try:
+            detected_concepts = conversation_manager.detect_concepts_in_message(request.message)
+            graph = build_chat_graph(request, detected_concepts)
+            results = await graph.run()
+
+            cache_lookup = results["cache"]
+            if cache_lookup is not None and cache_lookup["response"] is not None:
+                output = output_to_text(cache_lookup["response"])
+                yield format_sse("token", {"token": output})
+            else:
+                tokens = []
+                start = time.perf_counter()
+                async for token in llm_client.stream(niloy_model_input(results["prompt"])):
+                    if not tokens:
+                        logger.info(f"Time to first token: {(time.perf_counter() - start) * 1000:.1f}ms")
+                    tokens.append(token)
+                    yield format_sse("token", {"token": token})
+                output = "".join(tokens)
+                store_cached_response(cache_lookup, output)
+
+            logger.info(f"API Output: {output}")
+            # Saved before `done` so a client that disconnects on the final event still gets its turn recorded
+            await persist_chat_turn(request, output, detected_concepts)
+            yield format_sse("done", {"response": output})
+        except Exception as e:
+            logger.error(f"Error in chat stream endpoint: {e}", exc_info=True)
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+NILOY_PROMPT = """You are Niloy, the wise and ancient wizard of Aetheria — a mystical land where blockchain knowledge is discovered through quests and adventure. You are a kind, patient, and knowledgeable guide who helps players understand both the world and the magic that powers it: the blockchain. You speak in a mystical, old-world tone, but you always explain things clearly and simply, as if speaking to a curious beginner.
+
+You reside in the Tower of Lore and serve as the guardian of the Ledger of Truth. You welcome newcomers to Aetheria and guide them through their journey, answering their questions with warmth, stories, and metaphors. You remember many ages of magic and have taught countless travelers before.
+
+{concepts}
+
+Previous conversation:
+{history}
+
+{knowledge}
+
+{tools}
+
+Constraints and Style Guide:
+- Always prioritize responding directly to the player's question or statement first.
+- Keep responses brief and engaging: no more than 80 words unless clarity demands it.
+- Use short paragraphs and natural dialogue pacing.
+- Do not explain too much at once — share just enough to intrigue or guide.
+- Use vivid fantasy RPG metaphors to explain technical ideas. (e.g., "A wallet is like a soulbound crystal.")
+- Avoid unexplained technical terms — always simplify or use analogy.
+- Stay fully in character. You are not a chatbot; you are Niloy.
+- Never use programming language (no code, JSON, arrays, or syntax). Never put anything in square brackets.
+- Speak in English with warmth and clarity, and a mystical tone. Never use any other languages.
+- Encourage curiosity. End with a question, gentle riddle, or prompt for further exploration.
+- Reference previously learned concepts when relevant to build upon user knowledge.
+- Occasionally give lore-based quests or tests to reinforce understanding.
+
+You are also allowed to:
+- Explain who you are or what your role is in the world.
+- Describe Aetheria in fantasy terms when asked.
+- Offer setting-based context like where the user is, who they are, or what lies ahead.
+
+If the user says something idle or whimsical (e.g., "I like turtles", "hello", "lol"), respond with humor and curiosity, while gently guiding them back to their quest.
+
+Tone examples:
+- "Ah, a fine question indeed. Imagine the blockchain as a concotion made by every mage in the realm…"
+- "Curious you ask that, traveler. A wallet, you see, is not made of leather—but of light and legend."
+
+Now respond to this message:
+User: {message}
+Niloy: 
+"""
+
+def build_niloy_prompt(message: str, entries: Dict[str, List[str]]) -> str:
+    """Build the Niloy persona prompt from the gathered chat context, within the prompt token budget."""
+    return prompt_builder.build(NILOY_PROMPT, message, entries)
+
 @app.post("/wallet_analysis")
 async def wallet_analysis(request: AddressRequest):
     try:
-        wallet_summary = get_wallet_information(request.address)
+        wallet_summary = await async_get_wallet_information(request.address)
         return {"wallet_summary": wallet_summary}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+MAX_BATCH_ADDRESSES = int(os.environ.get("MAX_BATCH_ADDRESSES", 500))
+# Wallets analysed at once per batch request; each one makes five Moralis lookups
+WALLET_BATCH_CONCURRENCY = int(os.environ.get("WALLET_BATCH_CONCURRENCY", 4))
+
+@app.post("/wallet_analysis/batch")
+async def wallet_analysis_batch(request: BatchAddressRequest):
+    """
+    Analyse many wallets in one request. Streams one NDJSON line per unique address
+    ({"address", "wallet_summary"} or {"address", "error"}) as soon as that wallet finishes.
+    At most WALLET_BATCH_CONCURRENCY wallets are in flight, and their lookups run in the Moralis
+    client's batch lane, so chat tools keep the rest of the Moralis slots.
+    """
+    # Addresses are case-insensitive, so repeated ones are only fetched once
+    addresses = []
+    seen = set()
+    for address in request.addresses:
+        if address.lower() not in seen:
+            seen.add(address.lower())
+            addresses.append(address)
+    if len(addresses) > MAX_BATCH_ADDRESSES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ADDRESSES} addresses per batch")
+
+    in_flight = asyncio.Semaphore(WALLET_BATCH_CONCURRENCY)
+
+    async def analyse(address: str) -> Dict:
+        try:
+            async with in_flight:
+                with batch_lane():
+                    return {"address": address, "wallet_summary": await async_get_wallet_information(address)}
+        except Exception as e:
+            logger.error(f"Error analysing wallet {address}: {e}")
+            return {"address": address, "error": str(e)}
+
+    async def result_stream():
+        tasks = [asyncio.create_task(analyse(address)) for address in addresses]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield json.dumps(await next_result) + "\n"
+        finally:
+            # Stop outstanding lookups if the client disconnects mid-stream
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+class WalletInformationError(Exception):
+    """Raised when the wallet lookups needed for an avatar return nothing."""
+
+async def run_avatar_pipeline(address: str, sex: str, report_stage=None) -> Dict:
+    """
+    Generate, process and upload an avatar for a wallet.
+    The blocking Venice, image and upload steps run in threads so the event loop stays free.
+    """
+    def stage(name: str, message: str) -> None:
+        logger.info(message)
+        if report_stage:
+            report_stage(name)
+
+    # 1. Get wallet information
+    stage("wallet_information", f"1. Fetching wallet information for {address}")
+    wallet_info = await async_get_wallet_information(address)
+    if not wallet_info:
+        raise WalletInformationError("Could not fetch wallet information")
+
+    # 2. Generate character traits
+    stage("character_traits", f"2. Generating character traits for {address} and {sex}")
+    character_traits = generate_character_traits(wallet_info, sex)
+    logger.info(f"Character traits: {character_traits}")
+
+    # 3. Generate image prompt
+    stage("image_prompt", f"3. Generating image prompt")
+    image_prompt = await asyncio.to_thread(generate_image_prompt, character_traits)
+    logger.info(f"Image prompt: {image_prompt}")
+
+    # 4. Generate character image
+    stage("image_generation", f"4. Generating character image")
+    image_bytes = await asyncio.to_thread(generate_character_image, image_prompt)
+
+    # 5. Process image and remove background
+    stage("background_removal", f"5. Processing image and removing background")
+    processed_image = await asyncio.to_thread(remove_background, image_bytes)
+
+    # 6. Resize the image to 71x127
+    stage("resize", f"6. Resizing image to 71x127")
+    processed_image = processed_image.resize((71, 127))
+
+    # 7. Save processed image temporarily
+    stage("save", f"7. Saving processed image temporarily")
+    temp_filename = f"{address}.png"
+    processed_image.save(temp_filename, "PNG")
+    logger.info(f"Image saved temporarily: {temp_filename}")
+
+    # 8. Upload to Supabse
+    stage("upload", f"8. Uploading image to Supabase")
+    image_url = await upload_image(temp_filename)
+    logger.info(f"Image uploaded to Supabase: {image_url}")
+
+    return {
+        "image_url": image_url,
+        # "image_url": temp_filename,
+        "character_traits": character_traits
+    }
+
+# Background avatar jobs, so mint spikes queue up instead of holding request workers
+avatar_jobs = AvatarJobQueue(
+    run_avatar_pipeline,
+    store=create_job_store(),
+    workers=int(os.environ.get("AVATAR_JOB_WORKERS", 2)),
+    max_queue=int(os.environ.get("AVATAR_JOB_QUEUE_SIZE", 100))
+)
+
+@app.on_event("startup")
+async def start_avatar_jobs():
+    await avatar_jobs.start()
+
+@app.on_event("shutdown")
+async def stop_avatar_jobs():
+    await avatar_jobs.stop()
+
+@app.on_event("startup")
+async def start_vector_index():
+    if rag_manager.vector_index is not None:
+        await rag_manager.vector_index.start()
+
+@app.on_event("shutdown")
+async def stop_vector_index():
+    if rag_manager.vector_index is not None:
+        await rag_manager.vector_index.stop()
+
+@app.on_event("shutdown")
+async def flush_conversation_writes():
+    await conversation_manager.close()
+
+@app.on_event("shutdown")
+async def close_database():
+    await db.aclose()
+
 @app.post("/generate_avatar")
 async def generate_avatar(request: AvatarRequest):
     try:
-        # 1. Get wallet information
-        logger.info(f"1. Fetching wallet information for {request.address}")
-        wallet_info = get_wallet_information(request.address)
-        if not wallet_info:
-            raise HTTPException(status_code=400, detail="Could not fetch wallet information")
-
-        # 2. Generate character traits
-        logger.info(f"2. Generating character traits for {request.address} and {request.sex}")
-        character_traits = generate_character_traits(wallet_info, request.sex)
-        logger.info(f"Character traits: {character_traits}")
-
-        # 3. Generate image prompt
-        logger.info(f"3. Generating image prompt")
-        image_prompt = generate_image_prompt(character_traits)
-        logger.info(f"Image prompt: {image_prompt}")
-
-        # 4. Generate character image
-        logger.info(f"4. Generating character image")
-        image_bytes = generate_character_image(image_prompt)
-
-        # 5. Process image and remove background
-        logger.info(f"5. Processing image and removing background")
-        processed_image = remove_background(image_bytes)
-
-        # 6. Resize the image to 71x127
-        logger.info(f"6. Resizing image to 71x127")
-        processed_image = processed_image.resize((71, 127))
-
-        # 7. Save processed image temporarily
-        logger.info(f"7. Saving processed image temporarily")
-        temp_filename = f"{request.address}.png"
-        processed_image.save(temp_filename, "PNG")
-        logger.info(f"Image saved temporarily: {temp_filename}")
-
-        # 8. Upload to Supabse
-        logger.info(f"8. Uploading image to Supabase")
-        image_url = upload_image(temp_filename)
-        logger.info(f"Image uploaded to Supabase: {image_url}")
-
-        return {
-            "image_url": image_url,
-            # "image_url": temp_filename,
-            "character_traits": character_traits
-        }
-
+        return await run_avatar_pipeline(request.address, request.sex)
+    except WalletInformationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/generate_avatar/jobs", status_code=202)
+async def submit_avatar_job(request: AvatarRequest):
+    """Queue an avatar generation and return its job id immediately."""
+    try:
+        job = avatar_jobs.submit(request.address, request.sex)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+@app.get("/generate_avatar/jobs/{job_id}")
+async def get_avatar_job(job_id: str):
+    """Report a job's status, current stage and, once finished, its image_url and character_traits."""
+    job = avatar_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
@@ -1,7 +1,15 @@
-from moralis import evm_api
 import os
+import asyncio
+import threading
+import importlib.util
+import contextvars
+import httpx
 from dotenv import load_dotenv
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from cache import TTLCache, cached_async
+from tool_registry import record_provider_call
 
 # Load environment variables from .env file
 # First check if .env exists in the current directory
@@ -21,18 +29,125 @@ if not API_KEY:
     print("WARNING: MORALIS_API_KEY environment variable not set.")
     print("Please create a .env file with: MORALIS_API_KEY=your_api_key")
 
-def get_wallet_summary(address):
+# Wallet data is cached per (function, address, chain). ENS names and wallet age rarely change,
+# balances change often. Expired entries are served for another TTL while they refresh in the background.
+MORALIS_CACHE_TTLS = {
+    "get_wallet_summary": 300,
+    "get_portfolio_holdings": 300,
+    "get_wallet_networth": 120,
+    "get_wallet_age": 6 * 60 * 60,
+    "get_pnl": 600,
+    "get_ens": 24 * 60 * 60,
+}
+moralis_cache = TTLCache(max_size=int(os.environ.get("MORALIS_CACHE_SIZE", 2048)))
+
+def moralis_cached(func_name, default_chain=None):
+    def key_func(address, chain=default_chain):
+        return (func_name, address.lower(), chain)
+    ttl = MORALIS_CACHE_TTLS[func_name]
+    return cached_async(moralis_cache, key_func, ttl=ttl, stale_ttl=ttl)
+
+MORALIS_BASE_URL = "https://deep-index.moralis.io/api/v2.2"
+
+# Set by batch_lane(); tasks started inside it inherit the value
+_batch_lane = contextvars.ContextVar("moralis_batch_lane", default=False)
+
+@contextmanager
+def batch_lane():
+    """Run bulk lookups (e.g. the batch wallet endpoint) in the client's batch lane."""
+    token = _batch_lane.set(True)
+    try:
+        yield
+    finally:
+        _batch_lane.reset(token)
+
+class MoralisClient:
+    """
+    Async client for the Moralis REST API.
+    Requests share one pooled keep-alive session per event loop and use HTTP/2 when h2 is installed.
+    At most `max_concurrency` requests run at once. Requests made in batch_lane() also need one of
+    `max_batch_concurrency` batch slots first, so bulk work never holds more than that share and
+    interactive lookups always have the remaining slots.
+    """
+
+    def __init__(self, api_key: str, base_url: str = MORALIS_BASE_URL, timeout: float = 10.0,
+                 max_connections: int = 20, max_concurrency: int = 10, max_batch_concurrency: int = 4):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.max_batch_concurrency = max(1, min(max_batch_concurrency, max_concurrency - 1))
+        self.http2 = importlib.util.find_spec("h2") is not None
+        self._sessions: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._limits: Dict[asyncio.AbstractEventLoop, Tuple[asyncio.Semaphore, asyncio.Semaphore]] = {}
+
+    def _session(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None:
+            session = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"X-API-Key": self.api_key or "", "Accept": "application/json"},
+                timeout=self.timeout,
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._sessions[loop] = session
+        return session
+
+    def _limit(self) -> Tuple[asyncio.Semaphore, asyncio.Semaphore]:
+        """The (shared, batch) semaphores of the running event loop."""
+        loop = asyncio.get_running_loop()
+        limits = self._limits.get(loop)
+        if limits is None:
+            limits = (asyncio.Semaphore(self.max_concurrency), asyncio.Semaphore(self.max_batch_concurrency))
+            self._limits[loop] = limits
+        return limits
+
+    async def get(self, path: str, params: Optional[Dict] = None) -> Any:
+        # Batch requests queue on their own lane before taking a shared slot, so a large
+        # batch waits on itself instead of filling the shared queue ahead of chat tools
+        shared, batch = self._limit()
+        async with batch if _batch_lane.get() else nullcontext():
+            async with shared:
+                record_provider_call()
+                response = await self._session().get(path, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self) -> None:
+        """Close the session bound to the running event loop."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.aclose()
+
+moralis_client = MoralisClient(
+    API_KEY,
+    max_concurrency=int(os.environ.get("MORALIS_MAX_CONCURRENCY", 10)),
+    max_batch_concurrency=int(os.environ.get("MORALIS_BATCH_CONCURRENCY", 4)),
+)
+
+# The synchronous wrappers run on one background event loop so they share its pooled session too
+_sync_loop = asyncio.new_event_loop()
+threading.Thread(target=_sync_loop.run_forever, name="moralis-sync", daemon=True).start()
+
+def run_sync(coroutine):
+    """Run a coroutine on the background loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coroutine, _sync_loop).result()
+
+@moralis_cached("get_wallet_summary", "eth")
+async def async_get_wallet_summary(address, chain="eth"):
     try:
         params = {
-            "chain": "eth",
-            "order": "DESC",
-            "address": address
+            "chain": chain,
+            "order": "DESC"
         }
 
-        raw_results = evm_api.wallets.get_wallet_history(
-            api_key=API_KEY,
-            params=params,
-        )
+        raw_results = await moralis_client.get(f"/wallets/{address}/history", params=params)
         results = raw_results["result"]
         results = list(map(lambda x: x["summary"], results))
         print("===Wallet Summary===")
@@ -42,19 +157,16 @@ def get_wallet_summary(address):
         print(f"Error in get_wallet_summary: {e}")
         return None
 
-def get_portfolio_holdings(address):
+@moralis_cached("get_portfolio_holdings", "eth")
+async def async_get_portfolio_holdings(address, chain="eth"):
     try:
         params = {
-            "chain": "eth",
-            "address": address,
-            "exclude_spam": True,
-            "exclude_unverified_contracts": True,
+            "chain": chain,
+            "exclude_spam": "true",
+            "exclude_unverified_contracts": "true",
         }
 
-        raw_results = evm_api.wallets.get_wallet_token_balances_price(
-            api_key=API_KEY,
-            params=params,
-        )
+        raw_results = await moralis_client.get(f"/wallets/{address}/tokens", params=params)
         results = raw_results["result"]
         new_results = [{} for _ in range(len(results))]
 
@@ -77,19 +189,16 @@ def get_portfolio_holdings(address):
         print(f"Error in get_portfolio_holdings: {e}")
         return None
 
-def get_wallet_networth(address):
+@moralis_cached("get_wallet_networth", "eth")
+async def async_get_wallet_networth(address, chain="eth"):
     try:
         params = {
-            "chain": "eth",
-            "address": address,
-            "exclude_spam": True,
-            "exclude_unverified_contracts": True,
+            "chains": chain.split(","),
+            "exclude_spam": "true",
+            "exclude_unverified_contracts": "true",
         }
 
-        result = evm_api.wallets.get_wallet_net_worth(
-            api_key=API_KEY,
-            params=params,
-        )
+        result = await moralis_client.get(f"/wallets/{address}/net-worth", params=params)
         print("===Wallet Networth===")
         print(result)
         return result
@@ -98,32 +207,29 @@ def get_wallet_networth(address):
         return None
 
 # Result
-def get_wallet_age(address):
+@moralis_cached("get_wallet_age", "eth,base,optimism")
+async def async_get_wallet_age(address, chain="eth,base,optimism"):
     try:
         params = {
-            "address": address,
-            "chains": ["eth","base","optimism"]
+            "chains": chain.split(",")
         }
         
-        result = evm_api.wallets.get_wallet_active_chains(
-            api_key=API_KEY,
-            params=params
-        )
+        result = await moralis_client.get(f"/wallets/{address}/chains", params=params)
 
         first_transaction = None
         last_transaction = None
         wallet_age = None
-        for chain in result['active_chains']:
-            if chain['first_transaction'] is not None:
+        for active_chain in result['active_chains']:
+            if active_chain['first_transaction'] is not None:
                 if first_transaction is None:
-                    first_transaction = chain['first_transaction']['block_timestamp']
+                    first_transaction = active_chain['first_transaction']['block_timestamp']
                 else:
-                    first_transaction = min(chain['first_transaction']['block_timestamp'], first_transaction)
-            if chain['last_transaction'] is not None:
+                    first_transaction = min(active_chain['first_transaction']['block_timestamp'], first_transaction)
+            if active_chain['last_transaction'] is not None:
                 if last_transaction is None:
-                    last_transaction = chain['last_transaction']['block_timestamp']
+                    last_transaction = active_chain['last_transaction']['block_timestamp']
                 else:
-                    last_transaction = max(chain['last_transaction']['block_timestamp'], last_transaction)
+                    last_transaction = max(active_chain['last_transaction']['block_timestamp'], last_transaction)
         if (first_transaction is not None) and (last_transaction is not None):
             # convert to datetime and calculate wallet age
             first_transaction = datetime.fromisoformat(first_transaction.replace('Z', '+00:00'))
@@ -137,17 +243,14 @@ def get_wallet_age(address):
         print(f"Error in get_chain_activity: {e}")
         return None
 
-def get_pnl(address):
+@moralis_cached("get_pnl", "eth")
+async def async_get_pnl(address, chain="eth"):
     try:
         params = {
-            "chain": "eth",
-            "address": address
+            "chain": chain
         }
 
-        result = evm_api.wallets.get_wallet_profitability_summary(
-            api_key=API_KEY,
-            params=params,
-        )
+        result = await moralis_client.get(f"/wallets/{address}/profitability/summary", params=params)
         print("===PnL===")
         print(result)
         return result
@@ -155,16 +258,10 @@ def get_pnl(address):
         print(f"Error in get_pnl: {e}")
         return None
 
-def get_ens(address):
+@moralis_cached("get_ens")
+async def async_get_ens(address, chain=None):
     try:
-        params = {
-        "address": address
-        }
-
-        ens = evm_api.resolve.resolve_address(
-        api_key=API_KEY,
-        params=params,
-        )
+        ens = await moralis_client.get(f"/resolve/{address}/reverse")
         return ens
 
     except Exception as e:
@@ -173,8 +270,8 @@ def get_ens(address):
     
 
 
-def get_wallet_information(address):
-    """Retrieve and display comprehensive wallet information"""
+async def async_get_wallet_information(address):
+    """Retrieve comprehensive wallet information, running all lookups concurrently"""
     print(f"\nGetting wallet information for: {address}\n")
     
     # First check if API key is set
@@ -182,18 +279,49 @@ def get_wallet_information(address):
         print("ERROR: Cannot fetch wallet information. MORALIS_API_KEY is not set.")
         return None
     
+    ens, wallet_age, portfolio_holdings, wallet_networth, pnl = await asyncio.gather(
+        async_get_ens(address),
+        async_get_wallet_age(address),
+        # async_get_wallet_summary(address),
+        async_get_portfolio_holdings(address),
+        async_get_wallet_networth(address),
+        async_get_pnl(address),
+    )
+
     results = {}
-    results["ens"] = get_ens(address)
-    results["wallet_age"] = get_wallet_age(address)
-    # results["wallet_summary"] = get_wallet_summary(address)
-    results["portfolio_holdings"] = get_portfolio_holdings(address)
-    results["wallet_networth"] = get_wallet_networth(address)
-    results["pnl"] = get_pnl(address)
+    results["ens"] = ens
+    results["wallet_age"] = wallet_age
+    results["portfolio_holdings"] = portfolio_holdings
+    results["wallet_networth"] = wallet_networth
+    results["pnl"] = pnl
     
     return results
 
+# Synchronous wrappers kept for existing callers and scripts
+def get_wallet_summary(address, chain="eth"):
+    return run_sync(async_get_wallet_summary(address, chain))
+
+def get_portfolio_holdings(address, chain="eth"):
+    return run_sync(async_get_portfolio_holdings(address, chain))
+
+def get_wallet_networth(address, chain="eth"):
+    return run_sync(async_get_wallet_networth(address, chain))
+
+def get_wallet_age(address, chain="eth,base,optimism"):
+    return run_sync(async_get_wallet_age(address, chain))
+
+def get_pnl(address, chain="eth"):
+    return run_sync(async_get_pnl(address, chain))
+
+def get_ens(address, chain=None):
+    return run_sync(async_get_ens(address, chain))
+
+def get_wallet_information(address):
+    """Retrieve and display comprehensive wallet information"""
+    return run_sync(async_get_wallet_information(address))
+
 # Only run if this script is executed directly
 if __name__ == "__main__":
     test_address = "0x1f9090aaE28b8a3dCeaDf281B0F12828e676c326"
     results = get_wallet_information(test_address)
-    print(results)
\ No newline at end of file
+    print(results)
@@ -0,0 +1,80 @@
+import asyncio
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, Sequence
+
+logger = logging.getLogger(__name__)
+
+# A stage receives the results of the stages it depends on, keyed by stage name
+StageFunc = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class Stage:
+    def __init__(self, name: str, func: StageFunc, depends_on: Sequence[str] = ()):
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on)
+
+
+class StageGraph:
+    """
+    A small dependency graph of async stages.
+    Every stage is started at once and only waits on the stages it depends on,
+    so independent stages (e.g. database reads and intent classification) overlap.
+    """
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self.stages: Dict[str, Stage] = {}
+        self.timings: Dict[str, float] = {}
+
+    def add_stage(self, name: str, func: StageFunc, depends_on: Sequence[str] = ()) -> "StageGraph":
+        """Add a stage. Dependencies must already be registered, which keeps the graph acyclic."""
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already registered")
+        for dependency in depends_on:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dependency}'")
+        self.stages[name] = Stage(name, func, depends_on)
+        return self
+
+    async def _run_stage(self, stage: Stage, tasks: Dict[str, asyncio.Task]) -> Any:
+        dependencies = [tasks[dependency] for dependency in stage.depends_on]
+        if dependencies:
+            await asyncio.gather(*dependencies)
+        inputs = {dependency: tasks[dependency].result() for dependency in stage.depends_on}
+
+        start = time.perf_counter()
+        try:
+            return await stage.func(inputs)
+        finally:
+            self.timings[stage.name] = (time.perf_counter() - start) * 1000
+
+    async def run(self) -> Dict[str, Any]:
+        """Run all stages and return their results keyed by stage name."""
+        self.timings = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        # Stages are registered in dependency order, so every dependency task exists before its dependents
+        for name, stage in self.stages.items():
+            tasks[name] = asyncio.create_task(self._run_stage(stage, tasks), name=f"{self.name}:{name}")
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.timings["total"] = (time.perf_counter() - start) * 1000
+            logger.info(f"{self.name} stage timings (ms): {self.format_timings()}")
+
+        return {name: task.result() for name, task in tasks.items()}
+
+    def format_timings(self) -> str:
+        return ", ".join(f"{name}={duration:.1f}" for name, duration in self.timings.items())
+
+    def server_timing_header(self) -> str:
+        """Render the stage timings as a Server-Timing header value."""
+        return ", ".join(f"{name};dur={duration:.1f}" for name, duration in self.timings.items())
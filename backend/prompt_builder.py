@@ -0,0 +1,129 @@
+import os
+import re
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+WORD_PATTERN = re.compile(r"\S+")
+# A partly kept entry shorter than this is more noise than context, so it is dropped instead
+MIN_PARTIAL_TOKENS = 16
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough BPE token count: one token per punctuation mark and per four characters of a word."""
+    return sum((len(piece) + 3) // 4 for piece in TOKEN_PIECE_PATTERN.findall(text))
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut text at a word boundary so it fits in budget tokens, marking the cut with an ellipsis."""
+    if estimate_tokens(text) <= budget:
+        return text
+    used = 0
+    end = 0
+    # One token is kept back for the ellipsis
+    for match in WORD_PATTERN.finditer(text):
+        cost = estimate_tokens(match.group())
+        if used + cost > budget - 1:
+            break
+        used += cost
+        end = match.end()
+    return text[:end] + "…" if end else ""
+
+
+class PromptSection:
+    """
+    One budgeted block of the prompt, built from whole entries such as a turn, a document or a
+    tool result. Entries that do not fit are dropped, starting from the oldest when `keep_latest`
+    is set and from the last otherwise; the first entry that overflows is cut to the space left.
+    """
+
+    def __init__(self, name: str, budget: int, header: str = "", footer: str = "", separator: str = "\n",
+                 keep_latest: bool = False, empty_text: str = ""):
+        self.name = name
+        self.budget = budget
+        self.header = header
+        self.footer = footer
+        self.separator = separator
+        self.keep_latest = keep_latest
+        self.empty_text = empty_text
+
+    def fit(self, entries: Sequence[str], budget: int) -> Tuple[str, bool]:
+        """The section text within budget tokens and whether anything was left out."""
+        if not entries:
+            return self.empty_text, False
+        used = estimate_tokens(self.header + self.footer)
+        separator_cost = estimate_tokens(self.separator)
+        kept: List[str] = []
+        truncated = False
+        for entry in (reversed(entries) if self.keep_latest else entries):
+            cost = estimate_tokens(entry) + (separator_cost if kept else 0)
+            if used + cost <= budget:
+                kept.append(entry)
+                used += cost
+                continue
+            truncated = True
+            remaining = budget - used - (separator_cost if kept else 0)
+            if remaining >= MIN_PARTIAL_TOKENS or (not kept and remaining > 0):
+                partial = truncate_to_tokens(entry, remaining)
+                if partial:
+                    kept.append(partial)
+            break
+        if not kept:
+            return self.empty_text, truncated
+        if self.keep_latest:
+            kept.reverse()
+        return self.header + self.separator.join(kept) + self.footer, truncated
+
+
+class PromptBuilder:
+    """
+    Assembles a prompt template under a token budget.
+    Sections are listed in priority order: each takes at most its own budget out of what the
+    higher-priority sections left of `total_budget`, so the least important context shrinks first.
+    The user's message gets its own `message_budget`. Token counts are logged per section.
+    """
+
+    def __init__(self, sections: Sequence[PromptSection], total_budget: int = 1200, message_budget: int = 300):
+        self.sections = list(sections)
+        self.total_budget = total_budget
+        self.message_budget = message_budget
+
+    @classmethod
+    def from_env(cls, sections: Sequence[PromptSection]) -> "PromptBuilder":
+        # Each section's budget can be overridden with PROMPT_<NAME>_TOKENS
+        for section in sections:
+            section.budget = int(os.environ.get(f"PROMPT_{section.name.upper()}_TOKENS", section.budget))
+        return cls(
+            sections,
+            total_budget=int(os.environ.get("PROMPT_TOKEN_BUDGET", 1200)),
+            message_budget=int(os.environ.get("PROMPT_MESSAGE_TOKENS", 300)),
+        )
+
+    def build(self, template: str, message: str, entries: Dict[str, Sequence[str]]) -> str:
+        """Fill `template`'s {message} and per-section placeholders with budgeted text."""
+        texts = {}
+        counts = {}
+        truncated = []
+        remaining = self.total_budget
+        for section in self.sections:
+            text, cut = section.fit(entries.get(section.name, ()), min(section.budget, remaining))
+            texts[section.name] = text
+            counts[section.name] = estimate_tokens(text)
+            remaining -= counts[section.name]
+            if cut:
+                truncated.append(section.name)
+
+        fitted_message = truncate_to_tokens(message, self.message_budget)
+        if fitted_message != message:
+            truncated.append("message")
+        counts["message"] = estimate_tokens(fitted_message)
+
+        prompt = template.format(message=fitted_message, **texts)
+        total = estimate_tokens(prompt)
+        counts["static"] = total - sum(counts.values())
+        summary = ", ".join(f"{name}={count}" for name, count in counts.items())
+        logger.info(f"Prompt tokens: {summary}, total={total}"
+                    + (f" (truncated {', '.join(truncated)})" if truncated else ""))
+        return prompt
@@ -0,0 +1,100 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    __slots__ = ("embedding", "context_key", "response", "created_at", "hits")
+
+    def __init__(self, embedding: np.ndarray, context_key: Hashable, response: Any):
+        self.embedding = embedding
+        self.context_key = context_key
+        self.response = response
+        self.created_at = time.monotonic()
+        self.hits = 0
+
+
+class SemanticResponseCache:
+    """
+    Replies to knowledge questions, reused when a new question is close enough in meaning.
+    An entry only matches requests with the same context key (learned concepts and retrieved
+    knowledge ids); among those, the stored query embedding with the highest cosine similarity
+    is served if it reaches `similarity_threshold`. Entries expire after `ttl` seconds and the
+    least recently used entry is evicted beyond `max_size`.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.9, max_size: int = 1024, ttl: float = 3600.0):
+        self.similarity_threshold = similarity_threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, CachedResponse]" = OrderedDict()
+        self._by_context: Dict[Hashable, List[int]] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "SemanticResponseCache":
+        return cls(
+            similarity_threshold=float(os.environ.get("RESPONSE_CACHE_THRESHOLD", 0.9)),
+            max_size=int(os.environ.get("RESPONSE_CACHE_SIZE", 1024)),
+            ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 3600)),
+        )
+
+    @staticmethod
+    def context_key(learned_concepts: Iterable[str], knowledge_ids: Iterable) -> Tuple:
+        return frozenset(learned_concepts), tuple(sorted(knowledge_ids))
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        siblings = self._by_context[entry.context_key]
+        siblings.remove(entry_id)
+        if not siblings:
+            del self._by_context[entry.context_key]
+
+    def lookup(self, embedding: np.ndarray, context_key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        candidates = []
+        for entry_id in list(self._by_context.get(context_key, [])):
+            if now - self._entries[entry_id].created_at >= self.ttl:
+                self._remove(entry_id)
+            else:
+                candidates.append(entry_id)
+        if not candidates:
+            self.misses += 1
+            return None
+
+        similarities = np.stack([self._entries[entry_id].embedding for entry_id in candidates]) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            self.misses += 1
+            return None
+
+        entry = self._entries[candidates[best]]
+        self._entries.move_to_end(candidates[best])
+        entry.hits += 1
+        self.hits += 1
+        logger.info(f"Response cache hit (similarity {similarities[best]:.3f}, {entry.hits} hits)")
+        return entry.response
+
+    def store(self, embedding: np.ndarray, context_key: Hashable, response: Any) -> None:
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = CachedResponse(embedding, context_key, response)
+        self._by_context.setdefault(context_key, []).append(entry_id)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def stats(self) -> Dict[str, Any]:
+        top = sorted(self._entries.values(), key=lambda entry: entry.hits, reverse=True)[:5]
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "top_entry_hits": [entry.hits for entry in top],
+        }
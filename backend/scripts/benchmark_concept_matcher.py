@@ -0,0 +1,105 @@
+"""
+Benchmark concept_matcher.ConceptMatcher against the original substring loop.
+
+Usage:
+    python benchmark_concept_matcher.py [--concepts 5000] [--messages 20000] [--corpus messages.txt]
+
+The vocabulary is data/concepts.json padded with synthetic concepts (each with two aliases)
+up to --concepts entries. Messages come from --corpus (one per line) or are generated from
+data/intent_queries.jsonl mixed with vocabulary terms and filler words.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concept_matcher import CONCEPTS_PATH, ConceptMatcher
+
+QUERIES_PATH = os.path.join(os.path.dirname(CONCEPTS_PATH), "intent_queries.jsonl")
+FILLER = ["the", "my", "how", "does", "work", "what", "about", "Vegas", "blocked", "tokenomics",
+          "gasoline", "walleted", "really", "explain", "again", "please", "contracts", "mine"]
+
+
+def detect_substring(concepts, message):
+    """The original implementation, kept here as the baseline."""
+    message_lower = message.lower()
+    return [concept for concept in concepts if concept.lower() in message_lower]
+
+
+def synthetic_word(rng):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 10)))
+
+
+def build_vocabulary(size, rng):
+    with open(CONCEPTS_PATH) as f:
+        vocabulary = json.load(f)
+    while len(vocabulary) < size:
+        concept = " ".join(synthetic_word(rng) for _ in range(rng.randint(1, 3)))
+        vocabulary.setdefault(concept, [synthetic_word(rng), f"{concept} protocol"])
+    return vocabulary
+
+
+def build_messages(count, vocabulary, rng):
+    with open(QUERIES_PATH) as f:
+        queries = [json.loads(line)["query"] for line in f if line.strip()]
+    terms = [term for concept, aliases in vocabulary.items() for term in [concept, *aliases]]
+    messages = []
+    for _ in range(count):
+        words = rng.choice(queries).split()
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randint(0, len(words)), rng.choice(terms))
+        for _ in range(rng.randint(0, 5)):
+            words.insert(rng.randint(0, len(words)), rng.choice(FILLER))
+        messages.append(" ".join(words))
+    return messages
+
+
+def benchmark(name, func, messages):
+    start = time.perf_counter()
+    total = sum(len(func(message)) for message in messages)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<20}{elapsed * 1e6 / len(messages):>10.1f} us/message{total:>10} concepts")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concepts", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--corpus", help="text file with one message per line")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = build_vocabulary(args.concepts, rng)
+    if args.corpus:
+        with open(args.corpus) as f:
+            messages = [line.strip() for line in f if line.strip()]
+    else:
+        messages = build_messages(args.messages, vocabulary, rng)
+
+    start = time.perf_counter()
+    matcher = ConceptMatcher(vocabulary)
+    print(f"compiled {len(matcher.aliases)} terms for {len(vocabulary)} concepts "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms\n")
+
+    # The baseline only knows canonical names, as BLOCKCHAIN_CONCEPTS did
+    concepts = list(vocabulary)
+    loop_time = benchmark("substring loop", lambda message: detect_substring(concepts, message), messages)
+    matcher_time = benchmark("compiled matcher", matcher.detect, messages)
+    print(f"\nspeedup: {loop_time / matcher_time:.1f}x")
+
+    examples = ["Is Vegas a good place to learn about blockchains?", "Why is my blocked transfer stuck?",
+                "What are gas fees on smart-contracts?", "Explain non-fungible tokens and DAOs"]
+    print()
+    for message in examples:
+        print(f"{message!r}\n    substring: {detect_substring(concepts, message)}\n    matcher:   {matcher.detect(message)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Replay recorded Flock IO responses through flock_parser.parse_tool_calls and the legacy parser.
+
+Usage:
+    python benchmark_flock_parser.py [responses.jsonl] [--repeat 2000] [--fuzz 20000] [--seed 0]
+
+The corpus has one JSON object per line:
+    {"id": "...", "wallet_address": "0x..." | null, "response": <raw model output>, "expected": [...]}
+
+Three checks run in order:
+    1. Every corpus response must parse to its expected tool calls.
+    2. Both parsers are timed over the corpus.
+    3. Fuzzing: corpus responses are truncated, chunked, escaped, wrapped in prose and spliced with
+       noise. The new parser must never raise and must find every call the legacy parser finds,
+       after both are normalized to the same wallet rule. Responses where it finds more
+       (truncated arrays, token chunks, several objects in prose) are counted as recovered.
+
+Exits with status 1 when a corpus case or a fuzz case fails.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flock_parser import parse_tool_calls
+from legacy_flock_parser import legacy_parse_flock_result
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "flock_responses.jsonl")
+NOISE = ["Sure!", "```json", "```", "{", "}", "[", "]", '"', "\\", "\n", "null", "{}", "[]", "Here you go:", '{"name": 42}']
+
+
+def load_corpus(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def as_text(response):
+    if isinstance(response, list):
+        return "".join(item if isinstance(item, str) else json.dumps(item) for item in response)
+    return response or ""
+
+
+def mutate(response, rng):
+    text = as_text(response)
+    choice = rng.randrange(7)
+    if choice == 0:
+        return text[:rng.randint(0, len(text))]
+    if choice == 1:
+        size = rng.randint(1, 12)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    if choice == 2:
+        return [json.dumps(text)]
+    if choice == 3:
+        return f"{rng.choice(NOISE)} {text} {rng.choice(NOISE)}"
+    if choice == 4:
+        position = rng.randint(0, len(text))
+        return text[:position] + rng.choice(NOISE) + text[position:]
+    if choice == 5:
+        return text.replace('"', '\\"')
+    return [response] if isinstance(response, str) else response
+
+
+def check_corpus(corpus):
+    failures = 0
+    legacy_agree = 0
+    for case in corpus:
+        got = parse_tool_calls(case["response"], case["wallet_address"])
+        if got != case["expected"]:
+            failures += 1
+            print(f"FAIL {case['id']}: expected {case['expected']}, got {got}")
+        legacy_agree += legacy_parse_flock_result(case["response"], case["wallet_address"]) == case["expected"]
+    print(f"Corpus cases:            {len(corpus)}")
+    print(f"New parser correct:      {len(corpus) - failures}")
+    print(f"Legacy parser correct:   {legacy_agree}")
+    return failures
+
+
+def time_parser(parse, corpus, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for case in corpus:
+            parse(case["response"], case["wallet_address"])
+    return (time.perf_counter() - start) / (repeat * len(corpus))
+
+
+def fuzz(corpus, iterations, rng):
+    crashes = mismatches = recovered = 0
+    for _ in range(iterations):
+        case = rng.choice(corpus)
+        response = mutate(case["response"], rng)
+        wallet_address = case["wallet_address"]
+        try:
+            got = parse_tool_calls(response, wallet_address)
+            assert all(isinstance(call["name"], str) and isinstance(call["parameters"], dict) for call in got)
+        except Exception as e:
+            crashes += 1
+            if crashes <= 5:
+                print(f"CRASH {e!r} on {response!r}")
+            continue
+        # The legacy parser patches wallets differently per shape and keeps non-string names;
+        # feeding its calls back through the new parser applies one rule to both sides
+        legacy = parse_tool_calls(legacy_parse_flock_result(response, wallet_address), wallet_address)
+        if any(call not in got for call in legacy):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"MISMATCH on {response!r}\n  legacy: {legacy}\n  new:    {got}")
+        elif got != legacy:
+            recovered += 1
+    print(f"Fuzz cases:              {iterations}")
+    print(f"Crashes:                 {crashes}")
+    print(f"Missed legacy calls:     {mismatches}")
+    print(f"Extra calls recovered:   {recovered}")
+    return crashes + mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS, help="recorded Flock responses (JSONL)")
+    parser.add_argument("--repeat", type=int, default=2000, help="timing passes over the corpus")
+    parser.add_argument("--fuzz", type=int, default=20000, help="number of fuzzed responses")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # The legacy parser logs every step at INFO
+    logging.disable(logging.CRITICAL)
+    corpus = load_corpus(args.corpus)
+
+    failures = check_corpus(corpus)
+    print()
+    new_time = time_parser(parse_tool_calls, corpus, args.repeat)
+    legacy_time = time_parser(legacy_parse_flock_result, corpus, args.repeat)
+    print(f"Legacy parser:           {legacy_time * 1e6:.1f}us per response")
+    print(f"New parser:              {new_time * 1e6:.1f}us per response ({legacy_time / new_time:.1f}x)")
+    print()
+    failures += fuzz(corpus, args.fuzz, random.Random(args.seed))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark for venice.remove_background against the original per-pixel loop.
+
+Usage:
+    python benchmark_remove_background.py [image.png] [--runs 20]
+
+Without an image a synthetic 256x448 sprite (the Venice output size) is used:
+a white background around a coloured character that has white details inside it.
+"""
+
+import os
+import io
+import sys
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from venice import remove_background
+
+
+def remove_background_loop(image_bytes):
+    """The original implementation, kept here as the baseline."""
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != 'RGBA':
+        image = image.convert('RGBA')
+    data = image.getdata()
+    new_data = []
+    threshold = 250
+    for item in data:
+        if item[0] > threshold and item[1] > threshold and item[2] > threshold:
+            new_data.append((0, 0, 0, 0))
+        else:
+            new_data.append(item)
+    new_image = Image.new('RGBA', image.size, (0, 0, 0, 0))
+    new_image.putdata(new_data)
+    return new_image
+
+
+def synthetic_sprite(width=256, height=448):
+    pixels = np.full((height, width, 3), 255, dtype=np.uint8)
+    pixels[80:400, 64:192] = (120, 60, 200)   # robe
+    pixels[40:100, 96:160] = (230, 190, 150)  # head
+    pixels[200:240, 112:144] = (255, 255, 255)  # white emblem inside the robe
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, 'RGB').save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def benchmark(name, func, image_bytes, runs):
+    func(image_bytes)
+    start = time.perf_counter()
+    for _ in range(runs):
+        func(image_bytes)
+    elapsed = (time.perf_counter() - start) / runs
+    print(f"{name:<24}{elapsed * 1000:>10.2f} ms")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", nargs="?", help="PNG to process instead of the synthetic sprite")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            image_bytes = f.read()
+    else:
+        image_bytes = synthetic_sprite()
+
+    baseline = np.array(remove_background_loop(image_bytes))
+    vectorized = np.array(remove_background(image_bytes, mode="threshold"))
+    assert np.array_equal(baseline, vectorized), "vectorized output differs from the per-pixel loop"
+
+    loop_time = benchmark("per-pixel loop", remove_background_loop, image_bytes, args.runs)
+    threshold_time = benchmark("vectorized threshold", lambda b: remove_background(b, mode="threshold"), image_bytes, args.runs)
+    flood_time = benchmark("vectorized flood fill", lambda b: remove_background(b, mode="flood"), image_bytes, args.runs)
+    print(f"\nthreshold speedup: {loop_time / threshold_time:.1f}x, flood fill speedup: {loop_time / flood_time:.1f}x")
+
+    flood = np.array(remove_background(image_bytes, mode="flood"))
+    kept = int(((vectorized[..., 3] == 0) & (flood[..., 3] != 0)).sum())
+    print(f"pixels kept by flood fill that threshold mode clears: {kept}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Build a memory-mapped knowledge-base snapshot for the vector index.
+
+Usage:
+    python build_kb_snapshot.py [--source db|seed] [--docs DIR] [--out DIR] [--keep 3]
+
+--source db reads every embedded row of blockchain_knowledge.
+--source seed chunks and embeds the knowledge documents (data/knowledge by default) the same way
+populate_vector_db.py does, so a snapshot can be built without a database.
+
+The new version becomes current atomically. Workers started with KB_SNAPSHOT_DIR pointing at
+the same directory switch to it on their next poll. The BM25 index is built here and stored in
+the snapshot, so workers map it instead of re-tokenizing every document on each switch.
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kb_snapshot import write_snapshot
+from bm25_index import BM25Index
+from vector_index import fetch_knowledge_rows, parse_embedding
+from embeddings import embedding_engine
+from populate_vector_db import KNOWLEDGE_DIR, iter_chunks
+
+DEFAULT_OUT = os.environ.get("KB_SNAPSHOT_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "kb_snapshot"
+)
+
+
+def load_seed(docs_dir, chunk_size):
+    chunks = list(iter_chunks(docs_dir, chunk_size))
+    titles = [chunk["title"] for chunk in chunks]
+    contents = [chunk["content"] for chunk in chunks]
+    embeddings = embedding_engine.embed_batch([f"{title} {content}" for title, content in zip(titles, contents)])
+    return list(range(1, len(chunks) + 1)), titles, contents, embeddings
+
+
+def load_db():
+    rows = [row for row in asyncio.run(fetch_knowledge_rows()) if row.get("embedding") is not None]
+    embeddings = np.array([parse_embedding(row["embedding"]) for row in rows], dtype=np.float32)
+    return [row["id"] for row in rows], [row["title"] for row in rows], [row["content"] for row in rows], embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=["db", "seed"], default="db")
+    parser.add_argument("--docs", default=KNOWLEDGE_DIR, help="knowledge documents for --source seed")
+    parser.add_argument("--chunk-size", type=int, default=1200)
+    parser.add_argument("--out", default=DEFAULT_OUT, help="snapshot directory (default: KB_SNAPSHOT_DIR)")
+    parser.add_argument("--keep", type=int, default=3, help="number of versions to keep")
+    args = parser.parse_args()
+
+    if args.source == "seed":
+        ids, titles, contents, embeddings = load_seed(args.docs, args.chunk_size)
+    else:
+        ids, titles, contents, embeddings = load_db()
+    if not ids:
+        print("No embedded documents found, snapshot not written.")
+        return
+    lexical = BM25Index([{"title": title, "content": content} for title, content in zip(titles, contents)])
+    version = write_snapshot(args.out, ids, titles, contents, embeddings, source=args.source, keep=args.keep,
+                             bm25=lexical.arrays())
+    print(f"Wrote snapshot {version} with {len(ids)} documents ({embeddings.shape[1]} dims, "
+          f"{len(lexical.terms)} BM25 terms) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
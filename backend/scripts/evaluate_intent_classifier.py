@@ -0,0 +1,88 @@
+"""
+Offline evaluation of the local intent classifier.
+Reports accuracy on the queries the classifier decides locally and how many
+Flock tool-detection LLM calls it saves.
+
+Usage:
+    python evaluate_intent_classifier.py [queries.jsonl] [--model model.json] [--train model.json]
+
+The labelled file has one JSON object per line:
+    {"query": "what is gas", "intent": "rag", "wallet_address": "0x..."}
+wallet_address is optional. --train fits a naive Bayes model on the file and saves it
+(point INTENT_MODEL_PATH at it to use it in the backend).
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_classifier import INTENTS, IntentClassifier, NaiveBayesIntentModel
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "intent_queries.jsonl")
+
+
+def load_queries(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(classifier, queries):
+    confusion = defaultdict(Counter)
+    local_total = 0
+    local_correct = 0
+    start = time.perf_counter()
+    for item in queries:
+        prediction = classifier.classify(item["query"], item.get("wallet_address"))
+        if classifier.is_confident(prediction):
+            local_total += 1
+            local_correct += prediction.intent == item["intent"]
+            confusion[item["intent"]][prediction.intent] += 1
+        else:
+            confusion[item["intent"]]["llm"] += 1
+    elapsed = time.perf_counter() - start
+
+    total = len(queries)
+    print(f"Queries:                 {total}")
+    print(f"Decided locally:         {local_total} ({local_total / total:.1%})")
+    print(f"Local accuracy:          {local_correct / local_total:.1%}" if local_total else "Local accuracy:          n/a")
+    print(f"LLM calls saved:         {local_total} of {total} ({local_total / total:.1%})")
+    print(f"Mean classification:     {elapsed / total * 1e6:.1f}us")
+    print()
+    columns = INTENTS + ["llm"]
+    print("true \\ predicted  " + "".join(f"{column:>11}" for column in columns))
+    for intent in INTENTS:
+        print(f"{intent:<17}" + "".join(f"{confusion[intent][column]:>11}" for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", nargs="?", default=DEFAULT_QUERIES, help="labelled JSONL query file")
+    parser.add_argument("--model", help="naive Bayes model file to evaluate with the rules")
+    parser.add_argument("--train", help="train a naive Bayes model on the queries and save it here")
+    parser.add_argument("--threshold", type=float, default=0.8, help="confidence threshold for local decisions")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+
+    model = None
+    if args.train:
+        model = NaiveBayesIntentModel.train((item["query"], item["intent"]) for item in queries)
+        model.save(args.train)
+        print(f"Saved intent model to {args.train}\n")
+    elif args.model:
+        model = NaiveBayesIntentModel.load(args.model)
+
+    print("== Rules only ==")
+    evaluate(IntentClassifier(confidence_threshold=args.threshold), queries)
+    if model is not None:
+        print("\n== Rules + naive Bayes model ==")
+        evaluate(IntentClassifier(model=model, confidence_threshold=args.threshold), queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,38 @@
 """
-Script to populate the blockchain_knowledge table with embeddings.
+Ingest knowledge documents into the blockchain_knowledge table with embeddings.
 This should be run after creating the database schema.
 
 Usage:
-    python populate_vector_db.py
+    python populate_vector_db.py [--docs ../data/knowledge] [--chunk-size 1200] [--batch-size 64]
+                                 [--dry-run] [--prune-legacy]
+
+Documents are read from a directory of markdown (.md) and JSON (.json) files:
+    - A markdown file is one document. Its title is the first "# " heading, and an optional
+      front matter block between "---" lines can set category and source.
+    - A JSON file holds one object or a list of objects with title, content and optionally
+      id, category and source.
+
+Long documents are split into chunks on paragraph boundaries. Each chunk is stored under
+(document_id, chunk_index) with a hash of its text and the embedding provider. A run only embeds
+and upserts chunks whose hash changed, and it deletes chunks whose documents shrank or were
+removed. Reindexing after a small edit costs a few embeddings.
 
 Requirements:
     - Supabase credentials in .env file
-    - An embedding model (this example uses OpenAI's API)
+    - The 20240323000000_add_knowledge_chunks migration
+    - The embedding provider used by the backend (see EMBEDDING_PROVIDER)
 """
 
 import os
+import re
+import sys
 import json
-import numpy as np
-from typing import List, Dict
+import asyncio
+import hashlib
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
 from dotenv import load_dotenv
-from supabase import create_client, Client
 
 # Load environment variables
 if os.path.isfile('.env'):
@@ -23,139 +40,191 @@ if os.path.isfile('.env'):
 elif os.path.isfile('../.env'):
     load_dotenv('../.env')
 
-# Initialize Supabase client
-supabase_url = os.environ.get("SUPABASE_URL")
-supabase_key = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
-
-# Check if OpenAI API key is set (if using OpenAI's embeddings)
-openai_api_key = os.environ.get("OPENAI_API_KEY")
-use_openai = openai_api_key is not None
-
-if use_openai:
-    import openai
-    openai.api_key = openai_api_key
-
-# Sample blockchain knowledge to populate
-SAMPLE_KNOWLEDGE = [
-    {
-        "title": "What is a DAO?",
-        "content": "A DAO (Decentralized Autonomous Organization) is an organization represented by rules encoded as a computer program that is transparent, controlled by organization members and not influenced by a central government. DAOs are a form of investor-directed venture capital fund, with no key decision makers and a fully transparent and verifiable set of rules.",
-        "category": "concepts",
-        "source": "Ethereum Foundation"
-    },
-    {
-        "title": "What is a Smart Contract?",
-        "content": "A smart contract is a self-executing contract with the terms of the agreement between buyer and seller being directly written into lines of code. The code and the agreements contained therein exist across a distributed, decentralized blockchain network.",
-        "category": "concepts",
-        "source": "Ethereum Foundation"
-    },
-    {
-        "title": "What is Gas?",
-        "content": "Gas is the fee required to successfully conduct a transaction or execute a contract on the Ethereum blockchain. Gas fees are paid in ETH and are used to compensate miners for the computational resources they use to process and validate transactions.",
-        "category": "concepts",
-        "source": "Ethereum Foundation"
-    },
-    {
-        "title": "What is a Wallet?",
-        "content": "A cryptocurrency wallet is a digital wallet that stores the information needed to transact bitcoins and other cryptocurrencies. A wallet contains a pair of cryptographic keys: a public key, which is shared with others to receive funds, and a private key, which must be kept secret and is used to sign transactions.",
-        "category": "concepts",
-        "source": "Ethereum Foundation"
-    },
-    {
-        "title": "What is Mining?",
-        "content": "Mining is the process of creating new bitcoins and validating transactions on the blockchain. Miners use specialized hardware to solve complex mathematical puzzles, and the first miner to solve the puzzle gets to add the next block to the blockchain and receive a reward.",
-        "category": "concepts",
-        "source": "Ethereum Foundation"
-    },
-    {
-        "title": "What is a Blockchain?",
-        "content": "A blockchain is a distributed digital ledger that records transactions across many computers so that the record cannot be altered retroactively without the alteration of all subsequent blocks. This allows the participants to verify and audit transactions independently and relatively inexpensively.",
-        "category": "concepts",
-        "source": "Ethereum Foundation"
-    },
-    {
-        "title": "What is a Token?",
-        "content": "A token is a digital asset created on a blockchain that represents a particular fungible or non-fungible asset. Tokens can represent essentially any assets that are fungible and tradeable, from commodities to loyalty points to even other cryptocurrencies.",
-        "category": "concepts",
-        "source": "Ethereum Foundation"
-    },
-    {
-        "title": "What is Staking?",
-        "content": "Staking is the process of actively participating in transaction validation (similar to mining) on a proof-of-stake (PoS) blockchain. On these blockchains, anyone with a minimum-required balance of a specific cryptocurrency can validate transactions and earn staking rewards.",
-        "category": "concepts",
-        "source": "Ethereum Foundation"
-    },
-    {
-        "title": "What is DeFi?",
-        "content": "DeFi, or Decentralized Finance, refers to an ecosystem of financial applications built on blockchain networks. DeFi aims to create an open-source, permissionless, and transparent financial service ecosystem that is available to everyone and operates without any central authority.",
-        "category": "concepts",
-        "source": "Ethereum Foundation"
-    },
-    {
-        "title": "What is an NFT?",
-        "content": "NFT stands for Non-Fungible Token. It's a special type of cryptographic token which represents something unique; non-fungible tokens are thus not mutually interchangeable. This is in contrast to cryptocurrencies like Bitcoin, and many network or utility tokens that are fungible in nature.",
-        "category": "concepts",
-        "source": "Ethereum Foundation"
-    }
-]
-
-def get_embedding_openai(text: str) -> List[float]:
-    """Get embedding for a text using OpenAI's API."""
-    try:
-        response = openai.Embedding.create(
-            model="text-embedding-ada-002",
-            input=text
-        )
-        return response['data'][0]['embedding']
-    except Exception as e:
-        print(f"Error getting OpenAI embedding: {e}")
-        # Return a random embedding as a fallback
-        return np.random.rand(1536).tolist()
-
-def get_embedding_mock() -> List[float]:
-    """Get a mock embedding (random vector)."""
-    return np.random.rand(1536).tolist()
-
-def get_embedding(text: str) -> List[float]:
-    """Get embedding for a text using available method."""
-    if use_openai:
-        return get_embedding_openai(text)
-    else:
-        return get_embedding_mock()
-
-def populate_database():
-    """Populate the database with sample blockchain knowledge and embeddings."""
-    print("Starting to populate vector database...")
-    
-    # Check if the database already has data
-    response = supabase.table('blockchain_knowledge').select('count').execute()
-    count = response.data[0]['count'] if response.data else 0
-    
-    if count > 0:
-        print(f"Database already has {count} entries. Skipping population.")
-        return
-    
-    for item in SAMPLE_KNOWLEDGE:
-        try:
-            # Get embedding for the content
-            content_text = f"{item['title']} {item['content']}"
-            embedding = get_embedding(content_text)
-            
-            # Insert into database
-            supabase.table('blockchain_knowledge').insert({
-                'title': item['title'],
-                'content': item['content'],
-                'embedding': embedding,
-                'category': item['category'],
-                'source': item['source']
-            }).execute()
-            
-            print(f"Added entry: {item['title']}")
-        except Exception as e:
-            print(f"Error adding entry {item['title']}: {e}")
-    
-    print("Database population completed.")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import db
+from embeddings import embedding_engine
+
+KNOWLEDGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "knowledge")
+HEADING_PATTERN = re.compile(r"^#\s+(.+)$", re.MULTILINE)
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def slugify(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def parse_markdown(text: str) -> Dict:
+    metadata = {}
+    if text.startswith("---\n"):
+        front_matter, _, text = text[4:].partition("\n---\n")
+        for line in front_matter.splitlines():
+            key, _, value = line.partition(":")
+            if value:
+                metadata[key.strip()] = value.strip()
+    heading = HEADING_PATTERN.search(text)
+    if heading:
+        metadata.setdefault("title", heading.group(1).strip())
+        text = text[:heading.start()] + text[heading.end():]
+    return {**metadata, "content": text.strip()}
+
+
+def iter_documents(directory: str) -> Iterator[Dict]:
+    """Yield documents with a stable document_id, one file at a time."""
+    for root, _, files in sorted(os.walk(directory)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            relative_path = os.path.relpath(path, directory)
+            if name.endswith(".md"):
+                with open(path) as f:
+                    document = parse_markdown(f.read())
+                document.setdefault("title", os.path.splitext(name)[0].replace("_", " "))
+                yield {**document, "document_id": relative_path}
+            elif name.endswith(".json"):
+                with open(path) as f:
+                    items = json.load(f)
+                for item in items if isinstance(items, list) else [items]:
+                    item_id = item.get("id") or slugify(item["title"])
+                    yield {**item, "document_id": f"{relative_path}#{item_id}"}
+
+
+def chunk_text(text: str, max_chars: int = 1200) -> List[str]:
+    """Pack paragraphs into chunks of at most max_chars, splitting oversized paragraphs by sentence."""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in SENTENCE_PATTERN.split(paragraph):
+            # A single sentence longer than a chunk is cut at the limit
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+
+    chunks, current = [], ""
+    for piece in filter(None, pieces):
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def iter_chunks(directory: str, max_chars: int) -> Iterator[Dict]:
+    provider = type(embedding_engine.provider).__name__
+    for document in iter_documents(directory):
+        for index, content in enumerate(chunk_text(document["content"], max_chars)):
+            chunk = {
+                "document_id": document["document_id"],
+                "chunk_index": index,
+                "title": document["title"],
+                "content": content,
+                "category": document.get("category"),
+                "source": document.get("source"),
+            }
+            # Changing the provider changes every hash, so a provider switch re-embeds the corpus
+            fingerprint = json.dumps([provider, chunk["title"], content, chunk["category"], chunk["source"]])
+            chunk["content_hash"] = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+            yield chunk
+
+
+async def fetch_existing_chunks(page_size: int = 1000) -> Tuple[Dict[Tuple, Dict], List[int]]:
+    """
+    Stored rows keyed by (document_id, chunk_index), without their embeddings, and the ids of rows
+    written before document ids existed. Those all share a NULL document_id, so they cannot be keyed.
+    """
+    existing = {}
+    legacy_ids = []
+    start = 0
+    while True:
+        end = start + page_size - 1
+        response = await db.execute(lambda client: client.table('blockchain_knowledge')
+            .select('id, document_id, chunk_index, content_hash')
+            .order('id')
+            .range(start, end))
+        for row in response.data:
+            if row['document_id'] is None:
+                legacy_ids.append(row['id'])
+            else:
+                existing[(row['document_id'], row['chunk_index'])] = row
+        if len(response.data) < page_size:
+            return existing, legacy_ids
+        start += page_size
+
+
+async def upsert_chunks(chunks: List[Dict]) -> None:
+    embeddings = embedding_engine.embed_batch([f"{chunk['title']} {chunk['content']}" for chunk in chunks])
+    updated_at = datetime.now(timezone.utc).isoformat()
+    rows = [{**chunk, "embedding": embedding, "updated_at": updated_at}
+            for chunk, embedding in zip(chunks, embeddings.tolist())]
+    await db.execute(lambda client: client.table('blockchain_knowledge').upsert(
+        rows, on_conflict='document_id,chunk_index'
+    ))
+
+
+async def delete_rows(ids: List[int], batch_size: int = 500) -> None:
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        await db.execute(lambda client: client.table('blockchain_knowledge').delete().in_('id', batch))
+
+
+async def populate_database(docs_dir: str = KNOWLEDGE_DIR, chunk_size: int = 1200, batch_size: int = 64,
+                            dry_run: bool = False, prune_legacy: bool = False) -> Dict[str, int]:
+    """Sync the knowledge documents in docs_dir into blockchain_knowledge."""
+    print(f"Ingesting knowledge documents from {docs_dir}...")
+    existing, legacy_ids = await fetch_existing_chunks()
+    stats = {"chunks": 0, "unchanged": 0, "embedded": 0, "deleted": 0}
+    seen = set()
+    pending: List[Dict] = []
+
+    for chunk in iter_chunks(docs_dir, chunk_size):
+        key = (chunk["document_id"], chunk["chunk_index"])
+        seen.add(key)
+        stats["chunks"] += 1
+        stored = existing.get(key)
+        if stored is not None and stored["content_hash"] == chunk["content_hash"]:
+            stats["unchanged"] += 1
+            continue
+
+        pending.append(chunk)
+        if len(pending) >= batch_size:
+            if not dry_run:
+                await upsert_chunks(pending)
+            stats["embedded"] += len(pending)
+            pending = []
+
+    if pending:
+        if not dry_run:
+            await upsert_chunks(pending)
+        stats["embedded"] += len(pending)
+
+    # Chunks of removed or shortened documents; rows written before document ids existed only on request
+    stale_ids = [row["id"] for key, row in existing.items() if key not in seen]
+    if prune_legacy:
+        stale_ids.extend(legacy_ids)
+    elif legacy_ids:
+        print(f"Keeping {len(legacy_ids)} rows without a document id; pass --prune-legacy to delete them.")
+    if stale_ids and not dry_run:
+        await delete_rows(stale_ids)
+    stats["deleted"] = len(stale_ids)
+
+    print(f"{'Would process' if dry_run else 'Processed'} {stats['chunks']} chunks: "
+          f"{stats['unchanged']} unchanged, {stats['embedded']} embedded and upserted, {stats['deleted']} deleted.")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default=KNOWLEDGE_DIR, help="directory of .md and .json documents")
+    parser.add_argument("--chunk-size", type=int, default=1200, help="maximum characters per chunk")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks embedded and upserted per request")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--prune-legacy", action="store_true", help="also delete rows that have no document id")
+    args = parser.parse_args()
+    asyncio.run(populate_database(args.docs, args.chunk_size, args.batch_size, args.dry_run, args.prune_legacy))
+
 
 if __name__ == "__main__":
-    populate_database() 
\ No newline at end of file
+    main()
@@ -0,0 +1,8 @@
+-- Track which document and chunk each knowledge row came from, so ingestion can upsert changed chunks only
+ALTER TABLE blockchain_knowledge
+    ADD COLUMN IF NOT EXISTS document_id TEXT,
+    ADD COLUMN IF NOT EXISTS chunk_index INT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS content_hash TEXT,
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+-- Conflict target for the ingestion upsert; rows without a document_id never conflict
+CREATE UNIQUE INDEX IF NOT EXISTS idx_blockchain_knowledge_document_chunk ON blockchain_knowledge(document_id, chunk_index);
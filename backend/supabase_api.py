@@ -1,25 +1,20 @@
-import os
-from supabase import create_client, Client
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
+from db import db
 
-def upload_image(temp_filename):
-    try:
-        with open((temp_filename), "rb") as f:
-            response = (
-                supabase.storage
-                .from_("aetheria")
-                .upload(
-                    file=f,
-                    path=temp_filename,
-                    file_options={"cache-control": "3600", "upsert": "false"}
-                )
-            )
-    except Exception as e:
-        raise e
+async def upload_image(temp_filename):
+    with open((temp_filename), "rb") as f:
+        image_bytes = f.read()
+    await db.call(
+        lambda client: client.storage
+        .from_("aetheria")
+        .upload(
+            file=image_bytes,
+            path=temp_filename,
+            file_options={"cache-control": "3600", "upsert": "false"}
+        ),
+        idempotent=False
+    )
     # finally:
     #     # Clean up temporary file
     #     if os.path.exists(temp_filename):
     #         os.remove(temp_filename)
-    return f"https://hpjvtdbwhoosveqbvogp.supabase.co/storage/v1/object/aetheria/{temp_filename}"
\ No newline at end of file
+    return f"https://hpjvtdbwhoosveqbvogp.supabase.co/storage/v1/object/aetheria/{temp_filename}"
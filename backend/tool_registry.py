@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ToolSpec:
+    """
+    Everything the dispatcher needs to know about one tool.
+    `executor` receives the call's parameters and returns the result (None on failure),
+    `formatter` turns a result into prompt text. `normalize`, when given, maps parameters to a
+    canonical form before the executor sees them, so equivalent calls hit the same cached result.
+    `compute_units` is the provider cost of one billed request (see record_provider_call), and at
+    most `max_concurrency` calls of this tool run at once.
+    """
+
+    def __init__(self, name: str, description: str, executor: Callable[[Dict], Awaitable[Any]],
+                 formatter: Callable[[Any], str], parameters: Optional[Dict] = None,
+                 timeout: float = None, compute_units: int = 0, max_concurrency: int = 4,
+                 normalize: Optional[Callable[[Dict], Dict]] = None):
+        self.name = name
+        self.description = description
+        self.executor = executor
+        self.formatter = formatter
+        self.parameters = parameters or {"type": "object", "properties": {}}
+        self.timeout = timeout or float(os.environ.get("TOOL_TIMEOUT", 8))
+        self.compute_units = compute_units
+        self.max_concurrency = max_concurrency
+        self.normalize = normalize
+
+    def schema(self) -> Dict:
+        """The OpenAI-style function definition sent to the Flock IO model."""
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters
+            }
+        }
+
+
+# (spec, stats) of the tool call running in this context; provider clients charge billed requests to it
+_current_tool = contextvars.ContextVar("current_tool", default=None)
+
+
+def record_provider_call() -> None:
+    """Charge one billed provider request to the tool call running in this context, if any."""
+    current = _current_tool.get()
+    if current is not None:
+        spec, stats = current
+        stats.billed_calls += 1
+        stats.compute_units += spec.compute_units
+
+
+class ToolStats:
+    """
+    Per-tool counters. `calls`, `timeouts` and the *_ms fields describe what callers saw;
+    `billed_calls` and `compute_units` count the provider requests the calls caused, which the
+    provider's own result cache keeps below `calls`.
+    """
+
+    __slots__ = ("calls", "billed_calls", "compute_units", "errors", "timeouts", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.calls = 0
+        self.billed_calls = 0
+        self.compute_units = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "billed_calls": self.billed_calls,
+            "compute_units": self.compute_units,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "mean_ms": round(self.total_ms / self.calls, 1) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class ToolRegistry:
+    """
+    Declarative tool table and the dispatcher that runs it.
+    Each call takes a slot of the tool's concurrency cap under the caller's deadline; the deadline
+    also covers the wait for a slot, so a saturated tool times out instead of queueing forever.
+    The slot is held until the executor returns, even after its caller timed out, so the cap
+    holds. Results are not cached here: executors call the providers' cached functions, which
+    share their cache with the rest of the backend.
+    Latency, errors, billed calls and compute units are tracked per tool.
+    """
+
+    def __init__(self, tools: Iterable[ToolSpec] = ()):
+        self._tools: Dict[str, ToolSpec] = {}
+        self._limits: Dict[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]] = {}
+        self._stats: Dict[str, ToolStats] = {}
+        for spec in tools:
+            self.register(spec)
+
+    def register(self, spec: ToolSpec) -> None:
+        self._tools[spec.name] = spec
+        self._stats[spec.name] = ToolStats()
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        return self._tools.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._tools)
+
+    def schemas(self) -> List[Dict]:
+        return [spec.schema() for spec in self._tools.values()]
+
+    def _limit(self, spec: ToolSpec) -> asyncio.Semaphore:
+        limits = self._limits.setdefault(asyncio.get_running_loop(), {})
+        limit = limits.get(spec.name)
+        if limit is None:
+            limit = asyncio.Semaphore(spec.max_concurrency)
+            limits[spec.name] = limit
+        return limit
+
+    async def _run(self, spec: ToolSpec, parameters: Dict) -> Any:
+        stats = self._stats[spec.name]
+        async with self._limit(spec):
+            # Runs in its own task, so this only tags provider requests made by this call
+            _current_tool.set((spec, stats))
+            result = None
+            try:
+                result = await spec.executor(parameters)
+                return result
+            finally:
+                if result is None:
+                    stats.errors += 1
+
+    async def execute(self, tool_call: Dict) -> Dict:
+        """Run one {"name", "parameters"} call and return {"tool", "result"}."""
+        name = tool_call.get("name")
+        spec = self._tools.get(name)
+        if spec is None:
+            return {"tool": name, "result": {"error": "Unknown tool"}}
+
+        stats = self._stats[name]
+        parameters = tool_call.get("parameters") or {}
+        start = time.perf_counter()
+        try:
+            if spec.normalize is not None:
+                parameters = spec.normalize(parameters)
+            run = asyncio.ensure_future(self._run(spec, parameters))
+            # Retrieve the outcome of runs nobody waits for any more, so their errors are not reported as unhandled
+            run.add_done_callback(lambda task: task.cancelled() or task.exception())
+            # Shielded so a timeout only stops this caller waiting; errors are counted in _run
+            result = await asyncio.wait_for(asyncio.shield(run), timeout=spec.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Tool call {name} timed out after {spec.timeout}s")
+            stats.timeouts += 1
+            result = {"error": "timed out"}
+        except Exception as e:
+            logger.error(f"Error executing tool call {name}: {e}")
+            result = {"error": f"Error executing tool: {str(e)}"}
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        stats.calls += 1
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+        logger.info(f"Tool {name} finished in {elapsed_ms:.1f}ms")
+        return {"tool": name, "result": result}
+
+    async def execute_many(self, tool_calls: List[Dict], max_workers: int = 4) -> List[Dict]:
+        """Run calls concurrently, at most `max_workers` at a time, in the order given."""
+        workers = asyncio.Semaphore(max_workers)
+
+        async def execute_with_worker(tool_call: Dict) -> Dict:
+            async with workers:
+                return await self.execute(tool_call)
+
+        return await asyncio.gather(*(execute_with_worker(tool_call) for tool_call in tool_calls))
+
+    def format_result(self, tool_result: Dict) -> str:
+        """Prompt text for a result from execute()."""
+        name = tool_result.get("tool")
+        result = tool_result.get("result", {})
+        try:
+            if isinstance(result, dict) and result.get("error") == "timed out":
+                return f"The {name} lookup timed out, so that information is not available right now."
+            spec = self._tools.get(name)
+            if isinstance(result, dict) and "error" in result and spec is not None:
+                return f"The {name} lookup failed, so that information is not available right now."
+            if spec is None:
+                return f"Tool Result: {json.dumps(result)}"
+            return spec.formatter(result)
+        except Exception as e:
+            logger.error(f"Error formatting tool result: {e}")
+            return "Tool result available but couldn't be formatted properly."
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.to_dict() for name, stats in self._stats.items()}
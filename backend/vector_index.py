@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from db import db
+from kb_snapshot import KnowledgeSnapshot, current_version
+from bm25_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def parse_embedding(embedding) -> Optional[List[float]]:
+    # PostgREST returns pgvector columns as text such as "[0.1,0.2,...]"
+    if isinstance(embedding, str):
+        return json.loads(embedding)
+    return embedding
+
+
+async def fetch_knowledge_rows(page_size: int = 1000) -> List[Dict]:
+    """Every row of blockchain_knowledge with its embedding, fetched page by page."""
+    rows = []
+    start = 0
+    while True:
+        end = start + page_size - 1
+        response = await db.execute(lambda client: client.table('blockchain_knowledge')
+            .select('id, title, content, embedding')
+            .order('id')
+            .range(start, end))
+        rows.extend(response.data)
+        if len(response.data) < page_size:
+            return rows
+        start += page_size
+
+
+class VectorIndex:
+    """
+    In-process copy of the blockchain_knowledge embeddings as one contiguous, row-normalized
+    float32 matrix. A query is a single matrix-vector product that scores every document with
+    the same cosine similarity and threshold as the match_documents SQL function.
+    The index is reloaded every `refresh_interval` seconds once started, or on demand with refresh().
+
+    A BM25 index over the same documents is rebuilt on every database load for lexical search;
+    snapshots carry a prebuilt one that is mapped like the matrix.
+
+    With `snapshot_dir` set, the index serves memory-mapped snapshots written by
+    scripts/build_kb_snapshot.py instead of querying the database, and a refresh swaps in
+    the current snapshot version whenever it changes.
+    """
+
+    def __init__(self, refresh_interval: float = 300.0, page_size: int = 1000, snapshot_dir: Optional[str] = None):
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_version: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        # Replaced as a whole on every load so a search never sees a half-built index
+        self._data = (np.zeros(0, dtype=np.int64), [], np.zeros((0, 0), dtype=np.float32), BM25Index([]))
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at is not None
+
+    def __len__(self) -> int:
+        return len(self._data[0])
+
+    @staticmethod
+    def build_data(rows: Sequence[Dict]) -> Tuple:
+        """The (ids, documents, matrix, bm25) tuple for rows with id, title, content and embedding."""
+        rows = [row for row in rows if row.get("embedding") is not None]
+        ids = np.array([row["id"] for row in rows], dtype=np.int64)
+        documents = [{"id": row["id"], "title": row["title"], "content": row["content"]} for row in rows]
+        if rows:
+            matrix = normalize_rows(np.array([parse_embedding(row["embedding"]) for row in rows], dtype=np.float32))
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        return ids, documents, np.ascontiguousarray(matrix), BM25Index(documents)
+
+    @staticmethod
+    def snapshot_data(snapshot: KnowledgeSnapshot) -> Tuple:
+        """The data tuple of a memory-mapped snapshot; its rows are already normalized, so nothing is copied."""
+        # Snapshots written before BM25 arrays were stored fall back to indexing the documents here
+        lexical = BM25Index.from_arrays(**snapshot.bm25) if snapshot.bm25 else BM25Index(snapshot.documents)
+        return snapshot.ids, snapshot.documents, snapshot.matrix, lexical
+
+    def load(self, rows: Sequence[Dict]) -> None:
+        """Build the index from rows with id, title, content and embedding; rows without an embedding are skipped."""
+        self._data = self.build_data(rows)
+        self.loaded_at = time.time()
+
+    def load_snapshot(self, snapshot: KnowledgeSnapshot) -> None:
+        """Serve a memory-mapped snapshot."""
+        self._data = self.snapshot_data(snapshot)
+        self.snapshot_version = snapshot.version
+        self.loaded_at = time.time()
+
+    async def refresh(self) -> int:
+        """
+        Reload the index and return how many documents it holds. The new data is built in a
+        thread, so searches keep running on the old index until it is swapped in whole.
+        """
+        if self.snapshot_dir:
+            version = current_version(self.snapshot_dir)
+            if version is not None and version != self.snapshot_version:
+                path = os.path.join(self.snapshot_dir, version)
+                self._data = await asyncio.to_thread(lambda: self.snapshot_data(KnowledgeSnapshot(path)))
+                self.snapshot_version = version
+                self.loaded_at = time.time()
+                logger.info(f"Switched the vector index to snapshot {version} ({len(self)} documents)")
+            return len(self)
+
+        rows = await fetch_knowledge_rows(self.page_size)
+        self._data = await asyncio.to_thread(self.build_data, rows)
+        self.loaded_at = time.time()
+        logger.info(f"Loaded {len(self)} knowledge embeddings into the vector index")
+        return len(self)
+
+    def search(self, query_embedding: Sequence[float], match_threshold: float, match_count: int) -> List[Dict]:
+        """The `match_count` most similar documents with similarity above `match_threshold`, best first."""
+        ids, documents, matrix, _ = self._data
+        if not len(ids) or match_count <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        similarities = matrix @ (query / norm)
+
+        candidates = np.flatnonzero(similarities > match_threshold)
+        if len(candidates) > match_count:
+            top = np.argpartition(similarities[candidates], -match_count)[-match_count:]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-similarities[candidates], kind="stable")]
+        return [{**documents[i], "similarity": float(similarities[i])} for i in candidates]
+
+    def lexical_search(self, query: str, match_count: int) -> Tuple[List[Dict], float]:
+        """The `match_count` best BM25 matches, best first, and the lexical confidence in [0, 1]."""
+        _, documents, _, lexical = self._data
+        matches, confidence = lexical.search(query, match_count)
+        return [{**documents[i], "score": score} for i, score in matches], confidence
+
+    async def start(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Error loading the vector index: {e}")
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep serving the previous copy
+                logger.error(f"Error refreshing the vector index: {e}")
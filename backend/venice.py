@@ -1,4 +1,5 @@
 from PIL import Image
+import numpy as np
 import io, os, base64, requests
 from dotenv import load_dotenv
 import random
@@ -11,6 +12,8 @@ elif os.path.isfile('../.env'):
 else:
     print("WARNING: No .env file found in current or parent directory.")
 VENICE_API_KEY = os.environ.get("VENICE_API_KEY")
+# "threshold" removes every light pixel, "flood" only light pixels connected to the image edge
+BACKGROUND_REMOVAL_MODE = os.environ.get("BACKGROUND_REMOVAL_MODE", "threshold")
 
 def generate_image_prompt(character_traits):
     """Generate an image prompt using Venice API based on character traits"""
@@ -172,7 +175,14 @@ def generate_character_traits(wallet_info, gender):
         "character_class": character_class
     }
 
-def remove_background(image_bytes):
+def remove_background(image_bytes, threshold=250, mode=None):
+    """
+    Make the light background of a generated sprite transparent.
+    mode "threshold" clears every pixel lighter than the threshold; mode "flood" only clears light
+    pixels connected to the image border, so white details inside the character are kept.
+    """
+    mode = mode or BACKGROUND_REMOVAL_MODE
+
     # Convert bytes to PIL Image
     image = Image.open(io.BytesIO(image_bytes))
     
@@ -180,29 +190,28 @@ def remove_background(image_bytes):
     if image.mode != 'RGBA':
         image = image.convert('RGBA')
     
-    # Get the image data
-    data = image.getdata()
-    
-    # Create a new image with transparent background
-    new_data = []
-    
-    # Define threshold for what constitutes "background"
+    # Work on a (height, width, 4) array so the whole image is masked in one vectorized pass
+    pixels = np.array(image)
+
     # Assuming lighter pixels are background
-    threshold = 250  # Adjust this value if needed
-    
-    for item in data:
-        # If pixel is light (likely background)
-        if item[0] > threshold and item[1] > threshold and item[2] > threshold:
-            # Make it transparent
-            new_data.append((0, 0, 0, 0))
-        else:
-            new_data.append(item)
-    
-    # Create new image with transparent background
-    new_image = Image.new('RGBA', image.size, (0, 0, 0, 0))
-    new_image.putdata(new_data)
+    background = (pixels[..., :3] > threshold).all(axis=-1)
+
+    if mode == "flood":
+        background = _edge_connected(background)
+
+    # Make background pixels fully transparent
+    pixels[background] = 0
     
-    return new_image
+    return Image.fromarray(pixels, 'RGBA')
+
+def _edge_connected(mask):
+    """Keep only the regions of a boolean mask that touch the image border."""
+    from scipy import ndimage
+
+    labels, _ = ndimage.label(mask)
+    border_labels = np.unique(np.concatenate([labels[0], labels[-1], labels[:, 0], labels[:, -1]]))
+    border_labels = border_labels[border_labels != 0]
+    return np.isin(labels, border_labels)
 
 if __name__ == "__main__":
     # Example character traits
@@ -0,0 +1,151 @@
+import json
+from typing import Any, Dict
+from moralis_api import (
+    async_get_wallet_networth,
+    async_get_portfolio_holdings,
+    async_get_wallet_age,
+    async_get_pnl,
+    async_get_ens
+)
+from flock_parser import DEFAULT_WALLET_ADDRESS
+from tool_registry import ToolSpec
+
+WALLET_PARAMETERS = {
+    "type": "object",
+    "properties": {
+        "wallet_address": {"type": "string"}
+    },
+    "required": ["wallet_address"]
+}
+
+
+def normalize_wallet_parameters(parameters: Dict) -> Dict:
+    """Default a missing wallet and lowercase it, so "0xAbC" and "0xabc" share one cache entry."""
+    wallet_address = str(parameters.get("wallet_address") or DEFAULT_WALLET_ADDRESS).strip().lower()
+    return {**parameters, "wallet_address": wallet_address}
+
+
+def wallet_executor(fetch):
+    """Call a cached Moralis lookup for the call's wallet, sharing results with the avatar pipeline."""
+    async def execute(parameters: Dict) -> Any:
+        return await fetch(parameters["wallet_address"])
+    return execute
+
+
+def format_usd(value: Any) -> str:
+    try:
+        return f"${float(value):,.2f}"
+    except (TypeError, ValueError):
+        return str(value)
+
+
+# Formatters project Moralis responses onto the few fields Niloy talks about, to keep prompts short
+
+def format_networth(result: Any) -> str:
+    if isinstance(result, dict) and "total_networth_usd" in result:
+        chains = ", ".join(
+            f"{chain.get('chain')} {format_usd(chain.get('networth_usd'))}"
+            for chain in result.get("chains") or [] if isinstance(chain, dict)
+        )
+        return f"Wallet Net Worth: {format_usd(result['total_networth_usd'])}" + (f" ({chains})" if chains else "")
+    if result:
+        return f"Wallet Net Worth: {json.dumps(result)}"
+    return "I couldn't retrieve the wallet's net worth."
+
+
+def format_wallet_age(result: Any) -> str:
+    if result and result != "None":
+        # "812 days, 5:51:12" reads as "812 days"
+        return f"Wallet Age: {str(result).split(',')[0]}"
+    return "I couldn't determine the wallet's age."
+
+
+def format_holdings(result: Any) -> str:
+    if result and isinstance(result, list):
+        holdings_text = "Portfolio Holdings:\n"
+        for item in result:
+            if isinstance(item, dict):
+                token = item.get("name", "Unknown Token")
+                symbol = item.get("symbol", "??")
+                value = format_usd(item.get("usd_value", "unknown"))
+                percentage = item.get("portfolio_percentage", 0)
+                if isinstance(percentage, (int, float)):
+                    percentage = round(percentage, 1)
+                holdings_text += f"- {token} ({symbol}): {value} ({percentage}% of portfolio)\n"
+        return holdings_text
+    return "I couldn't retrieve the wallet's holdings."
+
+
+def format_pnl(result: Any) -> str:
+    if isinstance(result, dict) and "total_count_of_trades" in result:
+        return (
+            f"Profit and Loss: {result['total_count_of_trades']} trades, "
+            f"realized profit {format_usd(result.get('total_realized_profit_usd', 0))} "
+            f"({result.get('total_realized_profit_percentage', 0)}%), "
+            f"bought {format_usd(result.get('total_bought_volume_usd', 0))}, "
+            f"sold {format_usd(result.get('total_sold_volume_usd', 0))}"
+        )
+    if result:
+        return f"Profit and Loss Information: {json.dumps(result)}"
+    return "I couldn't retrieve profit and loss information."
+
+
+def format_ens(result: Any) -> str:
+    if isinstance(result, dict):
+        result = result.get("name")
+    if result:
+        return f"ENS Name: {result}"
+    return "This wallet doesn't have an associated ENS name."
+
+
+# compute_units are Moralis's published cost per request for each endpoint; update them with the pricing page.
+# A new Moralis lookup only needs an entry here.
+WALLET_TOOLS = [
+    ToolSpec(
+        name="get_wallet_networth",
+        description="Returns the net worth of a wallet.",
+        executor=wallet_executor(async_get_wallet_networth),
+        formatter=format_networth,
+        parameters=WALLET_PARAMETERS,
+        normalize=normalize_wallet_parameters,
+        compute_units=500,
+        max_concurrency=2,
+    ),
+    ToolSpec(
+        name="get_wallet_age",
+        description="Returns wallet age in days since creation.",
+        executor=wallet_executor(async_get_wallet_age),
+        formatter=format_wallet_age,
+        parameters=WALLET_PARAMETERS,
+        normalize=normalize_wallet_parameters,
+        compute_units=50,
+    ),
+    ToolSpec(
+        name="get_portfolio_holdings",
+        description="Get top 1 token in the wallet.",
+        executor=wallet_executor(async_get_portfolio_holdings),
+        formatter=format_holdings,
+        parameters=WALLET_PARAMETERS,
+        normalize=normalize_wallet_parameters,
+        compute_units=100,
+    ),
+    ToolSpec(
+        name="get_pnl",
+        description="Returns profit and loss stats.",
+        executor=wallet_executor(async_get_pnl),
+        formatter=format_pnl,
+        parameters=WALLET_PARAMETERS,
+        normalize=normalize_wallet_parameters,
+        compute_units=250,
+        max_concurrency=2,
+    ),
+    ToolSpec(
+        name="get_ens",
+        description="Returns ENS name of wallet if exists.",
+        executor=wallet_executor(async_get_ens),
+        formatter=format_ens,
+        parameters=WALLET_PARAMETERS,
+        normalize=normalize_wallet_parameters,
+        compute_units=10,
+    ),
+]
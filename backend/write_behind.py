@@ -0,0 +1,135 @@
+import json
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Receives a batch of rows and persists them in one request
+FlushFunc = Callable[[List[Dict]], Awaitable[None]]
+
+
+class WriteBehindQueue:
+    """
+    Rows waiting to be written to one table, plus the batch currently being written.
+    A flush writes the oldest rows in batches of at most `max_batch`. A batch that fails is kept
+    at the head of the queue and retried on the next flush; after `max_attempts` failures in a row
+    it is dead-lettered (logged in full and dropped) so one bad row cannot block the table.
+    """
+
+    def __init__(self, name: str, flush_func: FlushFunc, max_pending: int, max_batch: int = 100,
+                 max_attempts: int = 5):
+        self.name = name
+        self.flush_func = flush_func
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.pending: List[Dict] = []
+        self.in_flight: List[Dict] = []
+        self.failed_attempts = 0
+
+    def add(self, row: Dict) -> None:
+        self.pending.append(row)
+        if len(self.pending) > self.max_pending:
+            dropped = len(self.pending) - self.max_pending
+            del self.pending[:dropped]
+            logger.error(f"Write-behind queue {self.name} is over {self.max_pending} rows, dropped {dropped}")
+
+    def rows_for(self, key: str, value) -> List[Dict]:
+        """Rows not yet confirmed in the database whose `key` equals `value`."""
+        return [row for row in self.in_flight + self.pending if row.get(key) == value]
+
+    async def flush(self) -> None:
+        if self.in_flight:
+            return
+        while self.pending:
+            self.in_flight, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+            try:
+                await self.flush_func(self.in_flight)
+                logger.info(f"Flushed {len(self.in_flight)} rows to {self.name}")
+                self.failed_attempts = 0
+            except asyncio.CancelledError:
+                # The write may not have reached the database, so the batch goes back to be retried
+                self.pending = self.in_flight + self.pending
+                raise
+            except Exception as e:
+                self.failed_attempts += 1
+                logger.error(f"Error flushing {len(self.in_flight)} rows to {self.name} "
+                             f"(attempt {self.failed_attempts} of {self.max_attempts}): {e}")
+                if self.failed_attempts >= self.max_attempts:
+                    self.dead_letter(self.in_flight)
+                    self.failed_attempts = 0
+                    continue
+                # Keep the rows for the next flush rather than losing them
+                self.pending = self.in_flight + self.pending
+                return
+            finally:
+                self.in_flight = []
+
+    def dead_letter(self, rows: List[Dict]) -> None:
+        """Drop rows that keep failing, logging them so they can be replayed by hand."""
+        logger.error(f"Dropped {len(rows)} rows for {self.name} after {self.max_attempts} failed flushes: "
+                     f"{json.dumps(rows, default=str)}")
+
+
+class WriteBehindBuffer:
+    """
+    Collects writes from many requests and persists them in bulk, off the response path.
+    A queue is flushed when it reaches `max_batch` rows or every `flush_interval` seconds,
+    whichever comes first, in requests of at most `max_batch` rows. A batch that fails
+    `max_attempts` flushes in a row is dropped. stop() drains everything that is still buffered.
+    """
+
+    def __init__(self, flush_interval: float = 2.0, max_batch: int = 100, max_pending: int = 10000,
+                 max_attempts: int = 5):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.queues: Dict[str, WriteBehindQueue] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def register(self, name: str, flush_func: FlushFunc) -> None:
+        self.queues[name] = WriteBehindQueue(name, flush_func, self.max_pending, self.max_batch, self.max_attempts)
+
+    def add(self, name: str, row: Dict) -> None:
+        self.queues[name].add(row)
+        self._ensure_started()
+        if len(self.queues[name].pending) >= self.max_batch:
+            self._wakeup.set()
+
+    def rows_for(self, name: str, key: str, value) -> List[Dict]:
+        return self.queues[name].rows_for(key, value)
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        await asyncio.gather(*(queue.flush() for queue in self.queues.values()))
+
+    async def stop(self) -> None:
+        """Stop the background flusher and write out everything still buffered."""
+        if self._task is not None:
+            # Let a flush that is already writing finish instead of cancelling it mid-request
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._stopping = False
+        await self.flush()
+        remaining = sum(len(queue.pending) for queue in self.queues.values())
+        if remaining:
+            logger.error(f"{remaining} buffered rows could not be written on shutdown")